@@ -1,13 +1,90 @@
-import requests
 import json
+import os
 import re
-from typing import List, Dict
-from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
-import torch
-from config import (OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_MODEL,
-                    ANJALI_PERSONALITY, MOOD_PROMPTS, WEATHER_API_KEY, 
-                    WEATHER_API_URL, YOUR_CITY)
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Iterator, Mapping, Sequence, Tuple, TYPE_CHECKING
+from config import (OPENROUTER_API_KEY, OPENROUTER_BASE_URL, DEFAULT_MODEL, WEATHER_API_KEY,
+                    WEATHER_API_URL, QUOTE_API_URL, YOUR_CITY, CAPTION_BACKEND,
+                    CAPTION_MODEL_NAME, CAPTION_MODEL_CACHE_DIR, WEATHER_CACHE_TTL, BRIEFING_TIME,
+                    BRIEFING_PRECOMPUTE_MINUTES, BRIEFING_SCHEDULER_ENABLED)
+from caching import TTLCache
+from http_client import get_client
+from prompting import system_prompt
+from startup import lazy_import
+from telemetry import observe
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+SENTIMENT_TAG = "[sentiment: "
+SENTIMENT_PATTERN = re.compile(r"\[sentiment: (positive|neutral|negative)\]")
+FALLBACK_REPLY = "I'm having a little trouble connecting right now. Let's try again in a moment. 💭"
+
+class ChatStream:
+    """Iterates over the visible reply tokens of a streamed chat completion.
+
+    The trailing `[sentiment: ...]` tag is held back while it is being received,
+    so it never reaches the screen. Once iteration finishes, `content` holds the
+    full cleaned reply and `sentiment` the parsed label. Time to the first visible
+    token and to the end of the stream are recorded as `llm.ttft` and `llm.total`.
+    """
+    def __init__(self, deltas: Iterator[str]):
+        self._deltas = deltas
+        self._started = time.perf_counter()
+        self._first_token = False
+        self._buffer = ""
+        self._raw = ""
+        self.content = ""
+        self.sentiment = "neutral"
+        self.done = False
+
+    def __iter__(self):
+        try:
+            for delta in self._deltas:
+                self._raw += delta
+                self._buffer += delta
+                visible = self._release()
+                if visible:
+                    if not self._first_token:
+                        self._first_token = True
+                        observe("llm.ttft", time.perf_counter() - self._started)
+                    yield visible
+        except Exception as e:
+            print(f"Error while streaming from OpenRouter: {e}")
+            observe("llm.total", time.perf_counter() - self._started, error=True)
+            if not self._raw:
+                self._raw = self._buffer = FALLBACK_REPLY
+        else:
+            observe("llm.total", time.perf_counter() - self._started)
+        # Anything still held back at the end was not a sentiment tag after all
+        tail = SENTIMENT_PATTERN.sub("", self._buffer)
+        if tail.strip():
+            yield tail
+        self._finish()
+
+    def _release(self) -> str:
+        """Returns the part of the buffer that is safe to show right now."""
+        match = SENTIMENT_PATTERN.search(self._buffer)
+        if match:
+            self._buffer = self._buffer[:match.start()] + self._buffer[match.end():]
+        start = self._buffer.rfind("[")
+        if start != -1:
+            pending = self._buffer[start:]
+            if SENTIMENT_TAG.startswith(pending) or (pending.startswith(SENTIMENT_TAG) and "]" not in pending):
+                visible, self._buffer = self._buffer[:start], pending
+                return visible
+        visible, self._buffer = self._buffer, ""
+        return visible
+
+    def _finish(self):
+        sentiment_match = SENTIMENT_PATTERN.search(self._raw)
+        if sentiment_match:
+            self.sentiment = sentiment_match.group(1)
+        self.content = SENTIMENT_PATTERN.sub("", self._raw).strip()
+        self.done = True
 
 class ChatModel:
     def __init__(self):
@@ -15,64 +92,174 @@ class ChatModel:
         self.base_url = OPENROUTER_BASE_URL
         self.model = DEFAULT_MODEL
 
-    def generate_response(self, messages: List[Dict], mood: str = "friendly", temperature: float = 0.8) -> (str, str):
-        system_message = ANJALI_PERSONALITY
-        if mood in MOOD_PROMPTS:
-            system_message += f"\n\n{MOOD_PROMPTS[mood]}"
-
-        full_messages = [{"role": "system", "content": system_message}] + messages
+    def _build_request(self, messages: Sequence[Mapping], mood: str, temperature: float, stream: bool = False) -> (Dict, Dict):
+        # The per-mood system prefix is built once per process (see prompting.system_prompt)
+        full_messages = [{"role": "system", "content": system_prompt(mood)}] + [dict(m) for m in messages]
         headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
         data = {"model": self.model, "messages": full_messages, "temperature": temperature, "max_tokens": 500}
+        if stream:
+            data["stream"] = True
+        return headers, data
+
+    def stream_response(self, messages: Sequence[Mapping], mood: str = "friendly", temperature: float = 0.8) -> ChatStream:
+        """Streams the reply token by token. See `ChatStream` for the result."""
+        headers, data = self._build_request(messages, mood, temperature, stream=True)
+        return ChatStream(self._iter_deltas(headers, data))
+
+    def _iter_deltas(self, headers: Dict, data: Dict) -> Iterator[str]:
+        """Consumes the server-sent event stream and yields content deltas."""
+        with get_client().post("openrouter", f"{self.base_url}/chat/completions", headers=headers, json=data, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                # Blank keep-alives and ": comment" lines carry no data
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"].get("message", chunk["error"]))
+                choices = chunk.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    def generate_response(self, messages: Sequence[Mapping], mood: str = "friendly", temperature: float = 0.8) -> (str, str):
+        headers, data = self._build_request(messages, mood, temperature)
 
         try:
-            response = requests.post(f"{self.base_url}/chat/completions", headers=headers, json=data)
+            response = get_client().post("openrouter", f"{self.base_url}/chat/completions", headers=headers, json=data)
             response.raise_for_status()
             result = response.json()['choices'][0]['message']['content']
             
             # Extract content and sentiment
-            sentiment_match = re.search(r"\[sentiment: (positive|neutral|negative)\]", result)
+            sentiment_match = SENTIMENT_PATTERN.search(result)
             sentiment = "neutral"
             if sentiment_match:
                 sentiment = sentiment_match.group(1)
                 # Remove the sentiment tag from the response shown to the user
-                content = re.sub(r"\[sentiment: (positive|neutral|negative)\]", "", result).strip()
+                content = SENTIMENT_PATTERN.sub("", result).strip()
             else:
                 content = result
 
             return content, sentiment
         except Exception as e:
             print(f"Error calling OpenRouter: {e}")
-            return "I'm having a little trouble connecting right now. Let's try again in a moment. 💭", "neutral"
+            return FALLBACK_REPLY, "neutral"
+
+CAPTION_UNAVAILABLE = "I can see you've shared an image with me! 📸"
+CAPTION_FALLBACK = "I can see you've shared a lovely image! 🖼️"
 
 class ImageCaptionModel:
-    # (This class remains the same as your original code)
-    def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    # One instance is shared by every session (see resources.py), so loading and generation are locked.
+    # torch and transformers are only imported when the first image arrives.
+    # Backends (config.CAPTION_BACKEND):
+    #   "torch"      fp32 PyTorch, the reference
+    #   "torch-int8" dynamic int8 quantization of the Linear layers
+    #   "onnx"       vision encoder exported once to ONNX Runtime, text decoder in PyTorch
+    #   "onnx-int8"  int8 ONNX encoder plus int8 PyTorch decoder
+    def __init__(self, backend: str = CAPTION_BACKEND):
+        self.backend = backend
+        self.device = None
         self.processor = None
         self.model = None
+        self.encoder_session = None
         self.model_loaded = False
+        self.lock = threading.Lock()
     def load_model(self):
-        if not self.model_loaded:
-            try:
-                self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-                self.model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-                self.model.to(self.device)
-                self.model_loaded = True
-            except Exception as e:
-                print(f"Error loading BLIP model: {e}")
-    def caption_image(self, image: Image.Image) -> str:
+        with self.lock:
+            if not self.model_loaded:
+                try:
+                    torch = lazy_import("torch")
+                    transformers = lazy_import("transformers")
+                    self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+                    self.processor = transformers.BlipProcessor.from_pretrained(CAPTION_MODEL_NAME)
+                    self.model = transformers.BlipForConditionalGeneration.from_pretrained(CAPTION_MODEL_NAME)
+                    self.model.to(self.device)
+                    self.model.eval()
+                    if self.backend != "torch" and self.device.type != "cpu":
+                        print(f"Caption backend '{self.backend}' is CPU-only, using fp32 on {self.device}")
+                        self.backend = "torch"
+                    if self.backend.startswith("onnx"):
+                        self._load_onnx_encoder(quantized=self.backend == "onnx-int8")
+                    if self.backend.endswith("int8"):
+                        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+                    self.model_loaded = True
+                except Exception as e:
+                    print(f"Error loading BLIP model: {e}")
+    def _load_onnx_encoder(self, quantized: bool):
+        """Exports the vision encoder to ONNX on first load and opens a cached Runtime session."""
+        try:
+            ort = lazy_import("onnxruntime")
+        except ImportError:
+            print("onnxruntime is not installed, captioning with the PyTorch encoder")
+            self.backend = "torch-int8" if quantized else "torch"
+            return
+        model_slug = CAPTION_MODEL_NAME.replace("/", "--")
+        fp32_path = os.path.join(CAPTION_MODEL_CACHE_DIR, f"{model_slug}-vision.onnx")
+        path = fp32_path.replace(".onnx", "-int8.onnx") if quantized else fp32_path
+        if not os.path.exists(fp32_path):
+            self._export_vision_encoder(fp32_path)
+        if not os.path.exists(path):
+            quantization = lazy_import("onnxruntime.quantization")
+            quantization.quantize_dynamic(fp32_path, f"{path}.tmp", weight_type=quantization.QuantType.QInt8)
+            os.replace(f"{path}.tmp", path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.encoder_session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        # The encoder now runs in ONNX Runtime, so its PyTorch weights can go
+        self.model.vision_model = None
+    def _export_vision_encoder(self, path: str):
+        torch = lazy_import("torch")
+        vision_model = self.model.vision_model
+
+        class VisionEncoder(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.vision_model = vision_model
+            def forward(self, pixel_values):
+                return self.vision_model(pixel_values=pixel_values)[0]
+
+        size = self.processor.image_processor.size
+        dummy = torch.zeros(1, 3, size["height"], size["width"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with torch.no_grad():
+            torch.onnx.export(VisionEncoder().eval(), (dummy,), f"{path}.tmp", input_names=["pixel_values"],
+                              output_names=["image_embeds"], opset_version=17,
+                              dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}})
+        os.replace(f"{path}.tmp", path)
+    def caption_image(self, image: "Image.Image") -> str:
         if not self.model_loaded: self.load_model()
-        if not self.model_loaded: return "I can see you've shared an image with me! 📸"
+        if not self.model_loaded: return CAPTION_UNAVAILABLE
         try:
-            inputs = self.processor(image, return_tensors="pt").to(self.device)
-            out = self.model.generate(**inputs, max_length=50)
-            return self.processor.decode(out[0], skip_special_tokens=True)
-        except Exception: return "I can see you've shared a lovely image! 🖼️"
+            return self.caption_images([image])[0]
+        except Exception: return CAPTION_FALLBACK
+    def caption_images(self, images: List["Image.Image"]) -> List[str]:
+        """Captions a batch with a single `generate` call. Expects the model to be loaded."""
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with self.lock, lazy_import("torch").no_grad():
+            if self.encoder_session is None:
+                out = self.model.generate(**inputs, max_length=50)
+            else:
+                out = self._generate_with_onnx_encoder(inputs["pixel_values"])
+        return self.processor.batch_decode(out, skip_special_tokens=True)
+    def _generate_with_onnx_encoder(self, pixel_values):
+        # Mirrors BlipForConditionalGeneration.generate with the image embeddings coming from ONNX Runtime
+        torch = lazy_import("torch")
+        image_embeds = torch.from_numpy(self.encoder_session.run(None, {"pixel_values": pixel_values.numpy()})[0])
+        text_config = self.model.config.text_config
+        input_ids = torch.full((image_embeds.shape[0], 1), text_config.bos_token_id, dtype=torch.long)
+        image_attention_mask = torch.ones(image_embeds.shape[:-1], dtype=torch.long)
+        return self.model.text_decoder.generate(input_ids=input_ids, eos_token_id=text_config.sep_token_id,
+                                                pad_token_id=text_config.pad_token_id, encoder_hidden_states=image_embeds,
+                                                encoder_attention_mask=image_attention_mask, max_length=50)
 
 class MemoryProcessor:
-    # (This class remains the same as your original code)
-    def __init__(self, db):
+    # `retriever` is the shared RetrievalEngine; without one, context comes straight from Chroma
+    def __init__(self, db, retriever=None):
         self.db = db
+        self.retriever = retriever
     def extract_important_info(self, text: str) -> List[Dict]:
         memories = []
         lower_text = text.lower()
@@ -85,37 +272,146 @@ class MemoryProcessor:
         if any(w in lower_text for w in ["happy", "sad", "excited", "worried", "stressed"]):
             memories.append({"type": "emotion", "content": text, "importance": 5})
         return memories
+    def collect_memories(self, texts: List[Tuple[str, str]]) -> List[Dict]:
+        """Collapses the rule hits of each (text, context) pair into a single memory.
+
+        A text matching several rules becomes one memory tagged with every matching
+        type and the highest importance, ready for `MemoryDatabase.save_memories`.
+        """
+        collected = {}
+        for text, context in texts:
+            if not text:
+                continue
+            hits = self.extract_important_info(text)
+            if not hits:
+                continue
+            memory = collected.setdefault(text, {"content": text, "types": [], "importance": 0, "context": context})
+            for hit in hits:
+                if hit["type"] not in memory["types"]:
+                    memory["types"].append(hit["type"])
+                memory["importance"] = max(memory["importance"], hit["importance"])
+        return list(collected.values())
     def get_relevant_context(self, query: str, limit: int = 3) -> str:
-        results = self.db.search_memories(query, n_results=limit)
-        if results and results['documents']:
-            context = "Here's what I remember:\n" + "\n".join([f"- {doc}" for doc in results['documents'][0]])
+        if self.retriever is not None:
+            documents = [memory["content"] for memory in self.retriever.search(query, limit=limit)]
+        else:
+            results = self.db.search_memories(query, n_results=limit)
+            documents = results['documents'][0] if results and results['documents'] else []
+        if documents:
+            context = "Here's what I remember:\n" + "\n".join([f"- {doc}" for doc in documents])
             return context
         return ""
 
+class BriefingSourceError(Exception):
+    """An upstream briefing source failed and there was nothing cached to fall back on."""
+
+
 class DailyBriefingModel:
-    def get_weather(self):
-        if not WEATHER_API_KEY or not YOUR_CITY:
+    """Builds the daily briefing from cached weather and quote lookups.
+
+    Weather is cached per city for `WEATHER_CACHE_TTL`, the quote until midnight.
+    Both caches coalesce concurrent misses into one upstream call and keep serving
+    the last good value while a source is down. `start_scheduler()` refreshes both
+    shortly before `BRIEFING_TIME` so the morning rush is answered from memory.
+    """
+    def __init__(self):
+        self.weather_cache = TTLCache(WEATHER_CACHE_TTL)
+        self.quote_cache = TTLCache(_seconds_until_midnight())
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="briefing")
+        self.stopping = threading.Event()
+        self.scheduler = None
+
+    def get_weather(self, city: str = YOUR_CITY):
+        if not WEATHER_API_KEY or not city:
             return "Weather information isn't set up."
         try:
-            params = {"key": WEATHER_API_KEY, "q": YOUR_CITY, "aqi": "no"}
-            response = requests.get(WEATHER_API_URL, params=params)
-            response.raise_for_status()
-            data = response.json()
-            return (f"The weather in {YOUR_CITY} is currently {data['current']['temp_c']}°C "
-                    f"and feels like {data['current']['condition']['text']}.")
-        except Exception as e:
+            return self.weather_cache.get_or_load(city, lambda: self._fetch_weather(city), serve_stale=True)
+        except Exception:
             return "Sorry, I couldn't fetch the weather right now."
 
+    def _fetch_weather(self, city: str) -> str:
+        params = {"key": WEATHER_API_KEY, "q": city, "aqi": "no"}
+        response = get_client().get("weather", WEATHER_API_URL, params=params)
+        response.raise_for_status()
+        data = response.json()
+        return (f"The weather in {city} is currently {data['current']['temp_c']}°C "
+                f"and feels like {data['current']['condition']['text']}.")
+
     def get_quote_of_the_day(self):
         try:
-            response = requests.get("https://zenquotes.io/api/random")
-            response.raise_for_status()
-            data = response.json()[0]
-            return f'Quote of the day: "{data["q"]}" - {data["a"]}'
+            # One key, so yesterday's quote is still there as the stale fallback
+            return self.quote_cache.get_or_load("quote", self._fetch_quote, ttl=_seconds_until_midnight(),
+                                                serve_stale=True)
         except Exception:
             return "Let's make today a great day!"
 
-    def generate_briefing(self):
-        weather = self.get_weather()
-        quote = self.get_quote_of_the_day()
-        return f"Good morning! Here's your daily briefing:\n\n- **Weather**: {weather}\n- **Inspiration**: {quote}"
\ No newline at end of file
+    def _fetch_quote(self) -> str:
+        response = get_client().get("quotes", QUOTE_API_URL)
+        response.raise_for_status()
+        data = response.json()
+        if not data:
+            raise BriefingSourceError("Quote API returned no quotes")
+        return f'Quote of the day: "{data[0]["q"]}" - {data[0]["a"]}'
+
+    def generate_briefing(self, city: str = YOUR_CITY):
+        weather = self.executor.submit(self.get_weather, city)
+        quote = self.executor.submit(self.get_quote_of_the_day)
+        return (f"Good morning! Here's your daily briefing:\n\n- **Weather**: {weather.result()}"
+                f"\n- **Inspiration**: {quote.result()}")
+
+    def refresh(self, city: str = YOUR_CITY):
+        """Refetches both sources now, keeping the cached values if an upstream fails."""
+        for cache, key, loader, ttl in ((self.weather_cache, city, lambda: self._fetch_weather(city), None),
+                                        (self.quote_cache, "quote", self._fetch_quote, _seconds_until_midnight())):
+            try:
+                cache.put(key, loader(), ttl)
+            except Exception as e:
+                print(f"Briefing precompute for {key!r} failed, serving the cached value: {e}")
+
+    def start_scheduler(self):
+        """Refreshes the briefing `BRIEFING_PRECOMPUTE_MINUTES` before `BRIEFING_TIME` every day."""
+        if self.scheduler is None:
+            self.scheduler = threading.Thread(target=self._schedule, name="briefing-scheduler", daemon=True)
+            self.scheduler.start()
+
+    def _schedule(self):
+        while not self.stopping.wait(_seconds_until_precompute()):
+            self.refresh()
+            # Step past the precompute minute so it runs once per day
+            self.stopping.wait(60)
+
+    def close(self):
+        self.stopping.set()
+        if self.scheduler is not None:
+            self.scheduler.join(timeout=5)
+        self.executor.shutdown(wait=False)
+
+
+def _seconds_until_midnight() -> float:
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (midnight - now).total_seconds()
+
+
+def _seconds_until_precompute() -> float:
+    now = datetime.now()
+    hour, minute = map(int, BRIEFING_TIME.split(":"))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0) - timedelta(minutes=BRIEFING_PRECOMPUTE_MINUTES)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return (run_at - now).total_seconds()
+
+
+_briefing_model = None
+_briefing_model_lock = threading.Lock()
+
+def get_briefing_model() -> DailyBriefingModel:
+    """The process-wide briefing model. It outlives sessions, so the overnight precompute runs with nobody connected."""
+    global _briefing_model
+    if _briefing_model is None:
+        with _briefing_model_lock:
+            if _briefing_model is None:
+                _briefing_model = DailyBriefingModel()
+                if BRIEFING_SCHEDULER_ENABLED:
+                    _briefing_model.start_scheduler()
+    return _briefing_model
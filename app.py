@@ -1,32 +1,94 @@
 import streamlit as st
 from streamlit_lottie import st_lottie
-import requests
 import io
-from PIL import Image
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Import project modules
 from config import (
-    APP_NAME, ANJALI_AVATAR, USER_AVATAR, LOTTIE_ASSETS
+    APP_NAME, ANJALI_AVATAR, USER_AVATAR, WARMUP_ON_STARTUP, SHOW_STARTUP_REPORT,
+    CHAT_WINDOW_SIZE, CHAT_HISTORY_PAGE_SIZE, CONSOLIDATION_ENABLED, PIPELINE_STAGE_WORKERS,
+    SHOW_METRICS_PANEL, DEFAULT_USER_ID, ALLOW_QUERY_USER
 )
 from database import MemoryDatabase
-from ai_models import ChatModel, ImageCaptionModel, MemoryProcessor, DailyBriefingModel
+from ai_models import ChatModel, MemoryProcessor, get_briefing_model
+from captioning import CaptionService
+from retrieval import RetrievalEngine
+from consolidation import MemoryConsolidator
+from prompting import PromptBuilder, get_token_counter
+from pipeline import TurnPipeline, KeyedSerialExecutor
 from utils import apply_custom_css, text_to_speech_and_play, audio_to_text
+from assets import get_lottie_cache
+from resources import SessionResources
+from startup import start_warmup, import_report
+from telemetry import get_telemetry, timed
 
 # --- INITIALIZATION ---
+def auth_configured():
+    try:
+        return hasattr(st, "login") and "auth" in st.secrets
+    except Exception:
+        return False # No secrets.toml at all
+
+def current_user_id():
+    """The logged-in user's identity; never taken from anything the browser can freely edit unless opted in."""
+    identity = getattr(st, "user", None) # Streamlit >= 1.42 with [auth] configured
+    if identity is not None and identity.get("is_logged_in"):
+        return identity.get("email") or identity.get("sub")
+    if auth_configured():
+        # With login available, nobody shares the default user's memories by skipping it
+        st.button("Log in", on_click=st.login)
+        st.stop()
+    if ALLOW_QUERY_USER:
+        return st.query_params.get("user") or DEFAULT_USER_ID
+    return DEFAULT_USER_ID
+
 def init_session_state():
     """Initialize Streamlit session state variables."""
+    get_lottie_cache() # Starts the one-time prefetch of every mood animation
+    get_telemetry().start_server() # Only when METRICS_PORT is set; once per process
+    # Heavy objects are shared process-wide; the session only keeps references to them
+    if "resources" not in st.session_state:
+        st.session_state.resources = SessionResources()
+    resources = st.session_state.resources
+    if "user_id" not in st.session_state:
+        # Each user gets their own memories, history and relationship
+        st.session_state.user_id = current_user_id()
+    user_id = st.session_state.user_id
     if "db" not in st.session_state:
-        st.session_state.db = MemoryDatabase()
+        st.session_state.db = resources.get(f"db:{user_id}", lambda: MemoryDatabase(user_id))
     if "chat_model" not in st.session_state:
-        st.session_state.chat_model = ChatModel()
-    if "image_model" not in st.session_state:
-        st.session_state.image_model = ImageCaptionModel()
+        st.session_state.chat_model = resources.get("chat_model", ChatModel)
+    if "caption_service" not in st.session_state:
+        st.session_state.caption_service = resources.get("caption_service", CaptionService)
     if "memory_processor" not in st.session_state:
-        st.session_state.memory_processor = MemoryProcessor(st.session_state.db)
+        db = st.session_state.db
+        retriever = resources.get(f"retrieval_engine:{user_id}", lambda: RetrievalEngine(db))
+        st.session_state.memory_processor = MemoryProcessor(db, retriever)
+        if CONSOLIDATION_ENABLED:
+            resources.get(f"consolidator:{user_id}", lambda: start_consolidator(db))
+    if "prompt_builder" not in st.session_state:
+        st.session_state.prompt_builder = resources.get("prompt_builder", PromptBuilder)
+    if "pipeline" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+        st.session_state.pipeline = TurnPipeline(
+            db=st.session_state.db,
+            memory_processor=st.session_state.memory_processor,
+            chat_model=st.session_state.chat_model,
+            prompt_builder=st.session_state.prompt_builder,
+            caption_service=st.session_state.caption_service,
+            stage_executor=resources.get("stage_executor", lambda: ThreadPoolExecutor(PIPELINE_STAGE_WORKERS, "turn-stage")),
+            background=resources.get("background_tasks", KeyedSerialExecutor),
+        )
     if "briefing_model" not in st.session_state:
-        st.session_state.briefing_model = DailyBriefingModel()
+        st.session_state.briefing_model = get_briefing_model()
     if "messages" not in st.session_state:
+        # Pick up where the last conversation left off instead of starting empty
         st.session_state.messages = []
+        st.session_state.history_cursor = None
+        st.session_state.history_exhausted = False
+        st.session_state.chat_window = CHAT_WINDOW_SIZE
+        load_older_messages()
     if "mood" not in st.session_state:
         st.session_state.mood = "friendly"
     if "speak_output" not in st.session_state:
@@ -36,6 +98,12 @@ def init_session_state():
         st.session_state.last_prompt = ""
 
 
+def start_consolidator(db):
+    consolidator = MemoryConsolidator(db)
+    consolidator.start()
+    return consolidator
+
+
 # --- UI COMPONENTS ---
 def display_header():
     """Displays the main header with Lottie animation and relationship status."""
@@ -45,17 +113,13 @@ def display_header():
     
     col1, col2 = st.columns([1, 2])
     with col1:
-        lottie_url = LOTTIE_ASSETS.get(st.session_state.mood, LOTTIE_ASSETS["friendly"])
-        try:
-            # Safely get the Lottie animation with a timeout
-            response = requests.get(lottie_url, timeout=10)
-            response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-            lottie_json = response.json()
+        # Served from the local asset cache; never waits on the network
+        lottie_json = get_lottie_cache().get(st.session_state.mood)
+        if lottie_json:
             st_lottie(lottie_json, speed=1, height=150, key="lottie_mood")
-        except (requests.exceptions.RequestException, requests.exceptions.JSONDecodeError) as e:
-            # If the request fails or the response isn't valid JSON, show a placeholder emoji
+        else:
+            # Not cached yet (first start while offline or still downloading), show a placeholder emoji
             st.markdown(f"<h1 style='font-size: 100px; text-align: center;'>{ANJALI_AVATAR}</h1>", unsafe_allow_html=True)
-            print(f"Error: Could not load Lottie animation from {lottie_url}. Reason: {e}")
 
     with col2:
         st.title(APP_NAME)
@@ -91,6 +155,50 @@ def setup_sidebar():
         if uploaded_file:
             st.session_state.uploaded_file = uploaded_file
 
+        if "last_prompt_tokens" in st.session_state:
+            stats = st.session_state.prompt_builder.stats
+            average = stats["total_tokens"] / max(stats["prompts"], 1)
+            st.caption(f"Prompt tokens: {st.session_state.last_prompt_tokens} this turn, "
+                       f"{average:.0f} avg, {stats['max_tokens']} max")
+
+        if SHOW_STARTUP_REPORT:
+            with st.expander("⏱️ Startup imports"):
+                for module, seconds in sorted(import_report().items(), key=lambda item: -item[1]):
+                    st.caption(f"{module}: {seconds:.2f}s")
+
+        if SHOW_METRICS_PANEL:
+            with st.expander("📈 Stage latency"):
+                for stage, summary in get_telemetry().snapshot().items():
+                    st.caption(f"{stage}: p50 {summary['p50'] * 1000:.0f} ms, p95 {summary['p95'] * 1000:.0f} ms, "
+                               f"p99 {summary['p99'] * 1000:.0f} ms ({summary['count']} runs, {summary['errors']} failed)")
+
+
+def load_older_messages():
+    """Prepends the next older page of stored conversation to the session history."""
+    db = st.session_state.db
+    rows = db.get_conversation_page(before=st.session_state.history_cursor, limit=CHAT_HISTORY_PAGE_SIZE)
+    if len(rows) < CHAT_HISTORY_PAGE_SIZE:
+        st.session_state.history_exhausted = True
+    if rows:
+        st.session_state.history_cursor = db.conversation_cursor(rows[-1])
+        older = [{"role": role, "content": content} for _, role, content, _, _ in reversed(rows)]
+        st.session_state.messages[:0] = older
+
+def display_chat_history():
+    """Renders only the most recent window of messages, with older ones loaded on demand."""
+    messages = st.session_state.messages
+    has_older = len(messages) > st.session_state.chat_window or not st.session_state.history_exhausted
+    if has_older and st.button("⬆️ Load older messages", use_container_width=True):
+        st.session_state.chat_window += CHAT_WINDOW_SIZE
+        if st.session_state.chat_window > len(messages) and not st.session_state.history_exhausted:
+            load_older_messages()
+            messages = st.session_state.messages
+
+    for message in messages[-st.session_state.chat_window:]:
+        avatar = ANJALI_AVATAR if message["role"] == "assistant" else USER_AVATAR
+        with st.chat_message(message["role"], avatar=avatar):
+            st.write(message["content"])
+
 
 # --- CORE LOGIC ---
 def add_message(role, content, display_now=False):
@@ -103,6 +211,7 @@ def add_message(role, content, display_now=False):
         if role == "assistant" and st.session_state.speak_output:
             text_to_speech_and_play(content)
 
+@timed("turn")
 def process_user_input(prompt):
     """Handles user input, generates AI response, and updates the state."""
     if not prompt and "uploaded_file" not in st.session_state:
@@ -111,7 +220,6 @@ def process_user_input(prompt):
         
     add_message("user", prompt)
 
-    image_context = ""
     uploaded_file = st.session_state.pop("uploaded_file", None) # Use pop to consume the file
 
     with st.chat_message("user", avatar=USER_AVATAR):
@@ -119,37 +227,36 @@ def process_user_input(prompt):
             st.image(uploaded_file, width=200)
         st.write(prompt)
 
-    if uploaded_file:
-        with st.spinner("Looking at the image..."):
-            image = Image.open(uploaded_file).convert("RGB")
-            caption = st.session_state.image_model.caption_image(image)
-            image_context = f"\nThe user has shared an image with me. I see: {caption}"
-
-    with st.spinner("Anjali is thinking..."):
-        context = st.session_state.memory_processor.get_relevant_context(prompt)
-        
-        # Construct messages for the model
-        model_messages = st.session_state.messages[-10:] # Get recent history
-        if context:
-            model_messages.insert(0, {"role": "system", "content": context})
-        if image_context:
-            model_messages[-1]["content"] += image_context # Add image context to the last user message
-        
-        response, sentiment = st.session_state.chat_model.generate_response(
-            model_messages,
-            mood=st.session_state.mood
+    pipeline = st.session_state.pipeline
+    # Captioning and memory retrieval run concurrently; the prompt is built once both are in
+    with st.spinner("Looking at the image..." if uploaded_file else "Anjali is thinking..."):
+        prompt_messages = pipeline.prepare(
+            prompt,
+            history=st.session_state.messages[:-1],
+            mood=st.session_state.mood,
+            image_bytes=uploaded_file.getvalue() if uploaded_file else None,
         )
-        
-        # Update relationship based on sentiment
-        st.session_state.db.update_interaction_metrics(sentiment)
-        
-        # Process and save new memories from both user prompt and AI response
-        for text_to_process, text_context in [(prompt, "User said"), (response, "Anjali said")]:
-            memories = st.session_state.memory_processor.extract_important_info(text_to_process)
-            for mem in memories:
-                st.session_state.db.save_memory(mem["content"], mem["type"], mem["importance"], context=text_context)
-    
-    add_message("assistant", response, display_now=True)
+    st.session_state.last_prompt_tokens = prompt_messages.token_count
+
+    response, sentiment = render_stream(pipeline.respond(prompt_messages, mood=st.session_state.mood))
+
+    add_message("assistant", response)
+    # Sentiment, memory extraction and embedding happen after the reply is already on screen,
+    # queued before speech so they don't wait for synthesis
+    pipeline.finish(st.session_state.session_id, prompt, response, sentiment)
+    if st.session_state.speak_output:
+        text_to_speech_and_play(response)
+
+def render_stream(stream):
+    """Renders streamed tokens into the assistant bubble as they arrive."""
+    with st.chat_message("assistant", avatar=ANJALI_AVATAR):
+        placeholder = st.empty()
+        shown = ""
+        for token in stream:
+            shown += token
+            placeholder.markdown(shown + "▌")
+        placeholder.markdown(stream.content)
+    return stream.content, stream.sentiment
 
 # --- MAIN APP ---
 def main():
@@ -160,11 +267,7 @@ def main():
     display_header()
     setup_sidebar()
 
-    # Display chat history from session state
-    for message in st.session_state.messages:
-        avatar = ANJALI_AVATAR if message["role"] == "assistant" else USER_AVATAR
-        with st.chat_message(message["role"], avatar=avatar):
-            st.write(message["content"])
+    display_chat_history()
 
     # Use the session state variable as the value for the chat_input
     prompt = st.chat_input("What's on your mind?", key="chat_input_main")
@@ -178,5 +281,9 @@ def main():
         process_user_input(prompt)
         st.rerun()
 
+    # Heavy imports happen off the request path once the page is already on screen
+    if WARMUP_ON_STARTUP:
+        start_warmup(tasks=[get_token_counter().load_tokenizer])
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,135 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from config import LOTTIE_ASSETS, LOTTIE_CACHE_DIR, LOTTIE_REVALIDATE_SECONDS
+from http_client import get_client
+
+
+class LottieCache:
+    """Serves Lottie mood animations from memory, backed by an on-disk copy.
+
+    `get` never touches the network: a missing or stale entry only schedules a
+    background fetch, revalidated with ETag / Last-Modified so unchanged assets
+    cost a 304. When offline the last copy on disk keeps being served.
+    """
+    def __init__(self, assets: Dict[str, str] = LOTTIE_ASSETS, cache_dir: str = LOTTIE_CACHE_DIR,
+                 revalidate_seconds: float = LOTTIE_REVALIDATE_SECONDS):
+        self.assets = assets
+        self.cache_dir = cache_dir
+        self.revalidate_seconds = revalidate_seconds
+        self.animations = {}
+        self.meta = {}
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="lottie")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def prefetch(self):
+        """Loads every mood from disk and revalidates all of them in the background."""
+        for mood in self.assets:
+            self._load_from_disk(mood)
+            self._schedule_refresh(mood)
+
+    def get(self, mood: str) -> Optional[Dict]:
+        if mood not in self.assets:
+            mood = "friendly"
+        with self.lock:
+            animation = self.animations.get(mood)
+            checked_at = self.meta.get(mood, {}).get("checked_at", 0)
+        if time.time() - checked_at > self.revalidate_seconds:
+            self._schedule_refresh(mood)
+        return animation
+
+    def _paths(self, mood: str) -> (str, str):
+        base = os.path.join(self.cache_dir, mood)
+        return f"{base}.json", f"{base}.meta.json"
+
+    def _load_from_disk(self, mood: str):
+        data_path, meta_path = self._paths(mood)
+        try:
+            with open(data_path, encoding="utf-8") as f:
+                animation = json.load(f)
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        # A cached copy of a URL that has since changed in config is not worth serving
+        if meta.get("url") != self.assets[mood]:
+            return
+        with self.lock:
+            self.animations[mood] = animation
+            self.meta[mood] = meta
+
+    def _schedule_refresh(self, mood: str):
+        with self.lock:
+            if mood in self.pending:
+                return
+            self.pending.add(mood)
+        self.executor.submit(self._refresh, mood)
+
+    def _refresh(self, mood: str):
+        url = self.assets[mood]
+        with self.lock:
+            meta = dict(self.meta.get(mood, {}))
+        headers = {}
+        if meta.get("url") == url:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            response = get_client().get("lottie", url, headers=headers)
+            if response.status_code == 304:
+                meta["checked_at"] = time.time()
+                self._store(mood, None, meta)
+                return
+            response.raise_for_status()
+            animation = response.json()
+            meta = {"url": url, "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"), "checked_at": time.time()}
+            self._store(mood, animation, meta)
+        except Exception as e:
+            print(f"Error: Could not refresh Lottie animation from {url}. Reason: {e}")
+            with self.lock:
+                # Back off until the next revalidation window instead of retrying on every rerun
+                self.meta.setdefault(mood, {})["checked_at"] = time.time()
+        finally:
+            with self.lock:
+                self.pending.discard(mood)
+
+    def _store(self, mood: str, animation: Optional[Dict], meta: Dict):
+        data_path, meta_path = self._paths(mood)
+        with self.lock:
+            if animation is not None:
+                self.animations[mood] = animation
+            self.meta[mood] = meta
+        if animation is not None:
+            _write_json(data_path, animation)
+        _write_json(meta_path, meta)
+
+
+def _write_json(path: str, data):
+    """Writes through a temp file so a crash never leaves a half-written cache entry."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+_lottie_cache = None
+_lottie_lock = threading.Lock()
+
+def get_lottie_cache() -> LottieCache:
+    """Returns the process-wide cache, prefetching every mood on first use."""
+    global _lottie_cache
+    if _lottie_cache is None:
+        with _lottie_lock:
+            if _lottie_cache is None:
+                cache = LottieCache()
+                cache.prefetch()
+                _lottie_cache = cache
+    return _lottie_cache
@@ -0,0 +1,99 @@
+"""Compares BLIP captioning backends for latency, memory and caption quality.
+
+Each backend runs in its own interpreter so peak RSS is measured in isolation.
+Captions are scored against the fp32 "torch" backend with token-level F1.
+
+    python benchmarks/bench_caption.py path/to/images [--backends torch torch-int8 onnx onnx-int8]
+"""
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BACKENDS = ["torch", "torch-int8", "onnx", "onnx-int8"]
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def run_backend(backend, image_dir, repeats):
+    """Runs inside the child interpreter and prints one JSON result line."""
+    from PIL import Image
+    from ai_models import ImageCaptionModel
+
+    paths = sorted(os.path.join(image_dir, name) for name in os.listdir(image_dir)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    images = [Image.open(path).convert("RGB") for path in paths]
+
+    model = ImageCaptionModel(backend=backend)
+    start = time.perf_counter()
+    model.load_model()
+    load_seconds = time.perf_counter() - start
+
+    captions, latencies = [], []
+    for image in images:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            caption = model.caption_images([image])[0]
+            latencies.append(time.perf_counter() - start)
+        captions.append(caption)
+
+    print(json.dumps({
+        "backend": model.backend,
+        "load_seconds": load_seconds,
+        "latencies": latencies,
+        "captions": dict(zip(map(os.path.basename, paths), captions)),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def token_f1(candidate, reference):
+    candidate, reference = candidate.lower().split(), reference.lower().split()
+    common = sum(min(candidate.count(token), reference.count(token)) for token in set(candidate))
+    if not common:
+        return 0.0
+    precision, recall = common / len(candidate), common / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image_dir")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_backend(args.child, args.image_dir, args.repeats)
+        return
+
+    results = {}
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        output = subprocess.run([sys.executable, __file__, args.image_dir, "--repeats", str(args.repeats),
+                                 "--child", backend], capture_output=True, text=True, check=True).stdout
+        results[backend] = json.loads(output.strip().splitlines()[-1])
+
+    reference = results["torch"]["captions"]
+    print(f"{'backend':<11} {'ran as':<11} {'load s':>7} {'p50 s':>7} {'p95 s':>7} {'peak MB':>8} {'F1 vs fp32':>10} {'exact':>6}")
+    for backend, result in results.items():
+        captions = result["captions"]
+        f1 = statistics.mean(token_f1(captions[name], reference[name]) for name in reference) if reference else 0.0
+        exact = sum(captions[name] == reference[name] for name in reference) / max(len(reference), 1)
+        print(f"{backend:<11} {result['backend']:<11} {result['load_seconds']:7.2f} "
+              f"{percentile(result['latencies'], 50):7.3f} {percentile(result['latencies'], 95):7.3f} "
+              f"{result['peak_rss_mb']:8.0f} {f1:10.3f} {exact:6.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Offline end-to-end benchmark: concurrent simulated users against local service stubs.
+
+Starts benchmarks/stubs.py in a subprocess, points every upstream endpoint at it,
+and drives the same turn as app.process_user_input headlessly (save message,
+prepare with optional image, stream the reply, optional TTS, background memory
+work) from N users at once. Reports p50/p95/p99 per stage from the telemetry
+histograms, turn throughput and peak memory. Nothing leaves the machine:
+model weights (BLIP, the Chroma embedder) must already be in the local cache,
+otherwise captions fall back and the run says so.
+
+    python benchmarks/bench_e2e.py [--users 8] [--turns 10] [--image-ratio 0.3] [--memories 500] [--speak]
+                                   [--multi-user]
+"""
+import argparse
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stubs import FIXTURES, stub_env
+
+
+def start_stubs(args):
+    process = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "stubs.py"), "--port", "0",
+                                "--latency-ms", str(args.latency_ms), "--token-ms", str(args.token_ms),
+                                "--jitter-ms", str(args.jitter_ms)], stdout=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.startswith("READY "):
+            return process, line.split()[1]
+    raise RuntimeError("Stub server exited before it was ready")
+
+
+def make_images(count, rng):
+    """Small distinct JPEGs, so the caption cache doesn't hide the captioning cost."""
+    from PIL import Image
+    images = []
+    for _ in range(count):
+        image = Image.new("RGB", (640, 480), tuple(rng.randrange(256) for _ in range(3)))
+        image.paste(tuple(rng.randrange(256) for _ in range(3)), (rng.randrange(320), rng.randrange(240), 640, 480))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG")
+        images.append(buffer.getvalue())
+    return images
+
+
+def simulate_user(user, args, shared, messages, images, results):
+    """One session: the same steps as app.process_user_input, minus the widgets."""
+    from ai_models import MemoryProcessor
+    from pipeline import TurnPipeline
+    from telemetry import span
+    from tts import get_synthesizer
+
+    rng = random.Random(args.seed + user)
+    db, retriever = shared["users"][user if args.multi_user else 0]
+    pipeline = TurnPipeline(db=db, memory_processor=MemoryProcessor(db, retriever),
+                            chat_model=shared["chat_model"], prompt_builder=shared["prompt_builder"],
+                            caption_service=shared["caption_service"], stage_executor=shared["stage_executor"],
+                            background=shared["background"])
+    session_id, history, futures = f"user-{user}", [], []
+    for _ in range(args.turns):
+        prompt = rng.choice(messages)
+        image = rng.choice(images) if images and rng.random() < args.image_ratio else None
+        with span("turn", images=int(image is not None)):
+            history.append({"role": "user", "content": prompt})
+            db.save_conversation(role="user", content=prompt, mood="friendly")
+            prepared = pipeline.prepare(prompt, history=history[:-1], mood="friendly", image_bytes=image)
+            stream = pipeline.respond(prepared, mood="friendly")
+            for _ in stream:
+                pass
+            history.append({"role": "assistant", "content": stream.content})
+            db.save_conversation(role="assistant", content=stream.content, mood="friendly")
+            if args.speak:
+                with span("tts"):
+                    get_synthesizer().synthesize(stream.content)
+            futures.append(pipeline.finish(session_id, prompt, stream.content, stream.sentiment))
+        if args.think_ms:
+            time.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+    results[user] = futures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated sessions")
+    parser.add_argument("--turns", type=int, default=10, help="turns per user")
+    parser.add_argument("--image-ratio", type=float, default=0.0, help="share of turns that upload an image")
+    parser.add_argument("--memories", type=int, default=0, help="synthetic memories seeded before the run")
+    parser.add_argument("--speak", action="store_true", help="synthesize every reply through the TTS stub")
+    parser.add_argument("--multi-user", action="store_true",
+                        help="give every simulated session its own user (own shard rows, collection and memories)")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a user's turns")
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--token-ms", type=float, default=15.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the results to this file, for comparing runs")
+    args = parser.parse_args()
+
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    stubs, base_url = start_stubs(args)
+    # config reads the environment at import, so nothing from the app may be imported before this
+    os.environ.update(stub_env(base_url))
+    workdir = tempfile.TemporaryDirectory()
+    os.chdir(workdir.name) # Relative cache directories (TTS, Lottie, ONNX) land in the throwaway dir
+    try:
+        run(args, base_url)
+    finally:
+        stubs.terminate()
+        workdir.cleanup()
+
+
+def run(args, base_url):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from ai_models import CAPTION_UNAVAILABLE, ChatModel
+    from bench_retrieval import make_memories
+    from captioning import CaptionService
+    from config import PIPELINE_STAGE_WORKERS, DEFAULT_USER_ID
+    from database import MemoryDatabase, MemoryIndex
+    from pipeline import KeyedSerialExecutor
+    from prompting import PromptBuilder
+    from retrieval import RetrievalEngine
+    from telemetry import get_telemetry
+
+    rng = random.Random(args.seed)
+    with open(FIXTURES, encoding="utf-8") as f:
+        messages = json.load(f)["user_messages"]
+
+    index = MemoryIndex("chroma")
+    users = []
+    start = time.perf_counter()
+    for user in range(args.users if args.multi_user else 1):
+        # DB_PATH is relative, so the shards land in the throwaway working directory
+        db = MemoryDatabase(f"sim-user-{user}" if args.multi_user else DEFAULT_USER_ID)
+        db._index = index
+        if args.memories:
+            seeded = make_memories(args.memories, rng)
+            for offset in range(0, len(seeded), 256):
+                db.save_memories([{"content": content, "types": ["preference"], "importance": importance,
+                                   "context": "User said"} for content, importance, _ in seeded[offset:offset + 256]])
+            db.flush()
+        users.append((db, RetrievalEngine(db)))
+    if args.memories:
+        print(f"Seeded {args.memories} memories for each of {len(users)} users in {time.perf_counter() - start:.1f}s")
+
+    shared = {
+        "users": users,
+        "chat_model": ChatModel(),
+        "prompt_builder": PromptBuilder(),
+        "caption_service": CaptionService(),
+        "stage_executor": ThreadPoolExecutor(PIPELINE_STAGE_WORKERS, "turn-stage"),
+        "background": KeyedSerialExecutor(),
+    }
+    images = make_images(max(1, args.users * args.turns // 4), rng) if args.image_ratio > 0 else []
+    if images:
+        captioned = shared["caption_service"].submit(images[0]).result()
+        if captioned == CAPTION_UNAVAILABLE:
+            print("BLIP weights are not in the local cache; image turns measure the fallback path only")
+    get_telemetry().reset() # Leave seeding and warm-up out of the numbers
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results = {}
+    threads = [threading.Thread(target=simulate_user, args=(user, args, shared, messages, images, results),
+                                name=f"sim-user-{user}") for user in range(args.users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    foreground = time.perf_counter() - start
+    for futures in results.values():
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass # Already counted as a failed span
+    for db, _ in users:
+        db.flush()
+    drained = time.perf_counter() - start
+    rss_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    turns = sum(len(futures) for futures in results.values())
+    stages = get_telemetry().snapshot()
+    print(f"\n{args.users} users x {args.turns} turns against {base_url} "
+          f"(image ratio {args.image_ratio:.0%}, {args.memories} seeded memories, speak={args.speak}, "
+          f"multi-user={args.multi_user})")
+    print(f"{'stage':<18} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for stage, summary in stages.items():
+        print(f"{stage:<18} {summary['count']:6d} {summary['p50'] * 1000:9.1f} {summary['p95'] * 1000:9.1f} "
+              f"{summary['p99'] * 1000:9.1f} {summary['errors']:7d}")
+    print(f"\nThroughput: {turns / foreground:.2f} turns/s in the foreground, "
+          f"{turns / drained:.2f} turns/s including background work")
+    # ru_maxrss is in KiB on Linux
+    print(f"Peak RSS: {rss_peak:.0f} MB ({rss_peak - rss_before:+.0f} MB during the run)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "turns": turns, "foreground_seconds": foreground,
+                       "drained_seconds": drained, "peak_rss_mb": rss_peak, "stages": stages}, f, indent=2)
+
+    for name in ("caption_service", "background"):
+        shared[name].close()
+    shared["stage_executor"].shutdown()
+    for db, _ in users:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Latency and recall of memory retrieval: pure Chroma vs the hybrid RetrievalEngine.
+
+Seeds a throwaway SQLite + Chroma store with synthetic memories, then replays a
+query mix of greetings and fact lookups through MemoryProcessor.get_relevant_context.
+Lookups paraphrase their target memory, so a hit needs more than matching terms;
+recall@k counts lookups whose returned context holds a memory with the target's facts.
+
+    python benchmarks/bench_retrieval.py [--memories 5000] [--limit 3]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_models import MemoryProcessor
+from database import MemoryDatabase, MemoryIndex
+from retrieval import RetrievalEngine
+
+# Each value describes the key without sharing a content word with it, so lookups can't win on exact terms
+PEOPLE = {"sister": "female sibling", "brother": "male sibling", "best friend": "closest pal", "manager": "boss at work",
+          "cousin": "aunt's kid", "neighbour": "person living next door", "roommate": "flatmate", "teacher": "tutor"}
+NAMES = ["Priya", "Rahul", "Meera", "Arjun", "Kavya", "Rohan", "Isha", "Vikram", "Nisha", "Aman"]
+THINGS = {"pizza": "italian flatbread", "biryani": "spiced rice dish", "jazz": "saxophone music",
+          "cricket": "bat and ball sport", "painting": "working on canvases", "hiking": "mountain trails",
+          "chess": "board game with kings and pawns", "poetry": "writing verses", "sushi": "japanese raw fish",
+          "yoga": "stretching and breathing exercises"}
+EVENTS = {"birthday": "day I was born", "anniversary": "yearly celebration as a couple",
+          "job interview": "hiring conversation", "exam": "test at university", "dentist appointment": "teeth checkup",
+          "flight": "plane trip", "wedding": "marriage ceremony"}
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October"]
+GREETINGS = ["hi", "hello!", "hey there", "good morning", "ok", "thanks!", "lol", "yes", "how are you?"]
+
+
+def make_memories(count, rng):
+    """Returns (content, importance, (query, answer)) triples.
+
+    Contents carry a unique number so the near-duplicate filter keeps them all, and
+    the extraction trigger words real memories always contain. Queries paraphrase
+    the memory without its number or content words; a lookup counts as a hit when
+    the returned context contains `answer`, i.e. any memory with the same facts.
+    """
+    memories = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            person, name = rng.choice(list(PEOPLE)), rng.choice(NAMES)
+            content = f"My {person} {name} #{i} loves long conversations"
+            query = (f"what do you remember about my {PEOPLE[person]} called {name}?", f"My {person} {name} #")
+        elif kind == 1:
+            thing = rng.choice(list(THINGS))
+            content = f"My favorite weekend plan {i} involves {thing}"
+            query = (f"what should I do on saturday, maybe some {THINGS[thing]}?", f"involves {thing}")
+        else:
+            event, month = rng.choice(list(EVENTS)), rng.choice(MONTHS)
+            content = f"My {event} number {i} is in {month}"
+            query = (f"when is my {EVENTS[event]} coming up?", f"My {event} number")
+        memories.append((content, rng.randint(4, 9), query))
+    return memories
+
+
+def run(processor, queries, limit):
+    latencies, hits, lookups = [], 0, 0
+    for query, target in queries:
+        start = time.perf_counter()
+        context = processor.get_relevant_context(query, limit=limit)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if target is not None:
+            lookups += 1
+            hits += target in context
+    latencies.sort()
+    return {
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(0.95 * (len(latencies) - 1))],
+        "recall": hits / lookups if lookups else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--memories", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--limit", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = MemoryDatabase(path=os.path.join(tmp, "bench.db"))
+        db._index = MemoryIndex(os.path.join(tmp, "chroma"))
+        memories = make_memories(args.memories, rng)
+        start = time.perf_counter()
+        stored = set()
+        for offset in range(0, len(memories), 256):
+            saved = db.save_memories([{"content": content, "types": ["preference"], "importance": importance,
+                                       "context": "User said"} for content, importance, _ in memories[offset:offset + 256]])
+            stored.update(memory["content"] for memory in saved)
+        db.flush()
+        # Near-duplicate filtering may drop some synthetic memories; only query the ones that were kept
+        memories = [memory for memory in memories if memory[0] in stored]
+        print(f"Seeded {len(memories)} of {args.memories} memories in {time.perf_counter() - start:.1f}s")
+
+        lookups = rng.sample(memories, min(len(memories), args.queries))
+        queries = [query for _, _, query in lookups]
+        queries += [(rng.choice(GREETINGS), None) for _ in range(len(queries) // 3)]
+        rng.shuffle(queries)
+
+        baseline = MemoryProcessor(db)
+        hybrid = MemoryProcessor(db, RetrievalEngine(db))
+        results = {
+            "chroma only": run(baseline, queries, args.limit),
+            "hybrid (cold)": run(hybrid, queries, args.limit),
+            "hybrid (warm)": run(hybrid, queries, args.limit),
+        }
+        db.close()
+
+    print(f"{'path':<15} {'p50 ms':>8} {'p95 ms':>8} {f'recall@{args.limit}':>10}")
+    for name, result in results.items():
+        print(f"{name:<15} {result['p50']:8.2f} {result['p95']:8.2f} {result['recall']:10.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""Compares the legacy pydub/ffmpeg speech-to-text path with the in-process pipeline.
+
+For every recording it reports the audio duration and PCM payload handed to the
+recognizer, and the preprocessing and end-to-end latency of both paths. Without
+a recordings directory it generates clips shaped like browser recordings (48 kHz
+stereo, with silence before and after the speech), so it runs as is:
+
+    python benchmarks/bench_stt.py [path/to/recordings] [--stub] [--recognize --backend google|vosk|whisper]
+
+--stub measures end to end offline against the STT stub from benchmarks/stubs.py,
+whose recognition time grows with the payload like a real service. --recognize
+uses a real backend instead (network for google). When pydub or SpeechRecognition
+isn't installed, the legacy path on WAV input is emulated with the stdlib: same
+full-length, source-rate mono payload, without the ffmpeg round trip's cost.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import wave
+from collections import namedtuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".ogg", ".webm", ".m4a", ".flac")
+
+# What the old utils.audio_to_text sent on: mono 16-bit PCM at the recording's own rate, untrimmed
+LegacyAudio = namedtuple("LegacyAudio", "pcm sample_rate audio")
+
+
+def wav_bytes(samples, rate, channels=1):
+    """16-bit WAV from float samples in [-1, 1], interleaved when `channels` > 1."""
+    body = io.BytesIO()
+    with wave.open(body, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+    return body.getvalue()
+
+
+def make_clips(seed=7):
+    """(name, WAV bytes) clips: speech-like bursts with leading and trailing room noise."""
+    rng = np.random.default_rng(seed)
+    specs = [  # name, rate, channels, lead s, speech s, tail s, speech level
+        ("short-48k-stereo", 48000, 2, 0.6, 1.5, 0.8, 0.3),
+        ("long-pauses-48k-stereo", 48000, 2, 2.0, 2.5, 3.0, 0.3),
+        ("quiet-44k-mono", 44100, 1, 1.0, 3.0, 1.0, 0.05),
+        ("question-16k-mono", 16000, 1, 0.4, 2.0, 1.5, 0.3),
+    ]
+    clips = []
+    for name, rate, channels, lead, speech, tail, level in specs:
+        t = np.arange(int(speech * rate)) / rate
+        pitch = 120 + 40 * np.sin(2 * np.pi * 0.7 * t)
+        phase = 2 * np.pi * np.cumsum(pitch) / rate
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        # ~4 syllables a second with short gaps between words
+        syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) ** 0.5 * (np.sin(2 * np.pi * 0.9 * t) > -0.6)
+        signal = np.concatenate([np.zeros(int(lead * rate)), level * voice * syllables / 2, np.zeros(int(tail * rate))])
+        signal += rng.normal(0, 10 ** (-62 / 20), signal.size) # Room noise around -62 dBFS
+        samples = np.repeat(signal, channels) if channels > 1 else signal
+        clips.append((f"{name}.wav", wav_bytes(samples, rate, channels)))
+    return clips
+
+
+def load_clips(directory):
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.lower().endswith(AUDIO_EXTENSIONS))
+    if not paths:
+        sys.exit(f"No recordings ({', '.join(AUDIO_EXTENSIONS)}) in {directory}")
+    clips = []
+    for path in paths:
+        with open(path, "rb") as f:
+            clips.append((os.path.basename(path), f.read()))
+    return clips
+
+
+def legacy_prepare(audio_bytes):
+    """The old utils.audio_to_text preprocessing: ffmpeg round trip to a WAV file, read back whole."""
+    import speech_recognition as sr
+    from pydub import AudioSegment
+    segment = AudioSegment.from_file(io.BytesIO(audio_bytes))
+    wav_data = io.BytesIO()
+    segment.export(wav_data, format="wav")
+    wav_data.seek(0)
+    with sr.AudioFile(wav_data) as source:
+        audio = sr.Recognizer().record(source)
+    return LegacyAudio(audio.get_raw_data(convert_width=2), audio.sample_rate, audio)
+
+
+def legacy_prepare_emulated(audio_bytes):
+    """The same payload as `legacy_prepare` for WAV input, read with the stdlib (sr.AudioFile mixes down to mono)."""
+    with wave.open(io.BytesIO(audio_bytes)) as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError("the emulated legacy path only reads 16-bit WAV")
+        channels, rate = wav.getnchannels(), wav.getframerate()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype="<i2").reshape(-1, channels)
+    return LegacyAudio(samples.mean(axis=1).astype("<i2").tobytes(), rate, None)
+
+
+def legacy_recognize(prepared):
+    import speech_recognition as sr
+    try:
+        return sr.Recognizer().recognize_google(prepared.audio)
+    except sr.UnknownValueError:
+        return ""
+
+
+def stub_recognize(url, pcm, rate):
+    """Posts a mono 16-bit WAV to the STT stub, the way HttpRecognizer does."""
+    from http_client import get_client
+    body = io.BytesIO()
+    with wave.open(body, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm)
+    response = get_client().post("stt", url, data=body.getvalue(), headers={"Content-Type": "audio/wav"})
+    response.raise_for_status()
+    return response.json().get("text", "")
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures_dir", nargs="?", help="recordings to use instead of the generated clips")
+    parser.add_argument("--save", help="also write the generated clips to this directory")
+    parser.add_argument("--stub", action="store_true", help="measure end to end against the local STT stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=150.0)
+    parser.add_argument("--recognize", action="store_true", help="measure end to end with a real recognizer")
+    parser.add_argument("--backend", default="google", help="recognizer for the new path with --recognize")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from speech import HttpRecognizer, SpeechNotUnderstood, SpeechToText, preprocess
+
+    clips = load_clips(args.fixtures_dir) if args.fixtures_dir else make_clips(args.seed)
+    if args.save and not args.fixtures_dir:
+        os.makedirs(args.save, exist_ok=True)
+        for name, audio_bytes in clips:
+            with open(os.path.join(args.save, name), "wb") as f:
+                f.write(audio_bytes)
+    try:
+        import pydub, speech_recognition # noqa: F401
+        prepare_legacy = legacy_prepare
+    except ImportError:
+        print("pydub/SpeechRecognition not installed: emulating the legacy payload for WAV input\n")
+        prepare_legacy = legacy_prepare_emulated
+
+    stub, recognizer, old_recognize = None, None, None
+    if args.stub:
+        from stubs import StubServer
+        stub = StubServer(port=0, latency_ms=args.stub_latency_ms, jitter_ms=0, seed=args.seed).start()
+        url = f"{stub.base_url}/stt"
+        recognizer = HttpRecognizer(url=url)
+        old_recognize = lambda prepared: stub_recognize(url, prepared.pcm, prepared.sample_rate)
+    elif args.recognize:
+        recognizer = SpeechToText(backend=args.backend).load_recognizer()
+        if prepare_legacy is legacy_prepare:
+            old_recognize = legacy_recognize
+
+    rows = []
+    for name, audio_bytes in clips:
+        row = {"name": name}
+        try:
+            legacy_times = []
+            for _ in range(args.repeats):
+                legacy, elapsed = timed(prepare_legacy, audio_bytes)
+                legacy_times.append(elapsed)
+            row.update(old_bytes=len(legacy.pcm), old_seconds=len(legacy.pcm) / (2 * legacy.sample_rate),
+                       old_prep=statistics.median(legacy_times))
+            if old_recognize is not None:
+                row["old_text"], elapsed = timed(old_recognize, legacy)
+                row["old_total"] = row["old_prep"] + elapsed
+        except Exception as e:
+            # pydub needs ffmpeg on PATH for anything but WAV
+            print(f"{name}: legacy path failed ({e})")
+
+        new_times = []
+        for _ in range(args.repeats):
+            prepared, elapsed = timed(preprocess, audio_bytes)
+            new_times.append(elapsed)
+        row.update(new_bytes=len(prepared.pcm), new_seconds=prepared.duration, new_prep=statistics.median(new_times))
+        if recognizer is not None and prepared.pcm:
+            try:
+                row["new_text"], elapsed = timed(recognizer.transcribe, prepared)
+            except SpeechNotUnderstood:
+                row["new_text"], elapsed = "", 0.0
+            row["new_total"] = row["new_prep"] + elapsed
+        rows.append(row)
+    if stub is not None:
+        stub.close()
+
+    def cell(row, key, spec, scale=1.0):
+        return format(row[key] * scale, spec) if key in row else "-"
+
+    print(f"{'recording':<26} {'old s':>6} {'new s':>6} {'old KB':>8} {'new KB':>8} "
+          f"{'old prep ms':>11} {'new prep ms':>11} {'old e2e s':>9} {'new e2e s':>9}")
+    for row in rows:
+        print(f"{row['name'][:26]:<26} {cell(row, 'old_seconds', '.2f'):>6} {cell(row, 'new_seconds', '.2f'):>6} "
+              f"{cell(row, 'old_bytes', '.1f', 1 / 1024):>8} {cell(row, 'new_bytes', '.1f', 1 / 1024):>8} "
+              f"{cell(row, 'old_prep', '.1f', 1000):>11} {cell(row, 'new_prep', '.1f', 1000):>11} "
+              f"{cell(row, 'old_total', '.2f'):>9} {cell(row, 'new_total', '.2f'):>9}")
+        if args.recognize:
+            print(f"    old: {row.get('old_text', '-')!r}\n    new: {row.get('new_text', '-')!r}")
+
+    compared = [row for row in rows if "old_bytes" in row]
+    if compared:
+        old_bytes, new_bytes = sum(r["old_bytes"] for r in compared), sum(r["new_bytes"] for r in compared)
+        print(f"\nPayload: {old_bytes / 1024:.0f} KB -> {new_bytes / 1024:.0f} KB "
+              f"({1 - new_bytes / max(old_bytes, 1):.0%} smaller) over {len(compared)} recordings")
+        print(f"Preprocessing median: {statistics.median(r['old_prep'] for r in compared) * 1000:.1f} ms -> "
+              f"{statistics.median(r['new_prep'] for r in compared) * 1000:.1f} ms")
+    ended = [row for row in compared if "old_total" in row and "new_total" in row]
+    if ended:
+        print(f"End to end median: {statistics.median(r['old_total'] for r in ended):.2f} s -> "
+              f"{statistics.median(r['new_total'] for r in ended):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Local stand-ins for every upstream service, replaying recorded responses.
+
+Serves OpenRouter chat completions (plain JSON and SSE streaming), WeatherAPI,
+zenquotes, Lottie assets (with ETags), and the http TTS / STT backends, each
+after a configurable latency with jitter. Point the app at it through the
+environment variables printed on start-up:
+
+    python benchmarks/stubs.py [--port 8765] [--latency-ms 150] [--token-ms 15] [--jitter-ms 30]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "stub_responses.json")
+MOODS = ["friendly", "romantic", "funny", "supportive", "thinking"]
+
+
+def stub_env(base_url):
+    """Environment overrides that send every upstream call of the app to the stubs at `base_url`."""
+    return {
+        "OPENROUTER_BASE_URL": f"{base_url}/openrouter",
+        "OPENROUTER_API_KEY": os.environ.get("OPENROUTER_API_KEY") or "stub-key",
+        "WEATHER_API_URL": f"{base_url}/weather/current.json",
+        "WEATHER_API_KEY": os.environ.get("WEATHER_API_KEY") or "stub-key",
+        "QUOTE_API_URL": f"{base_url}/quotes/random",
+        "LOTTIE_BASE_URL": f"{base_url}/lottie",
+        "TTS_BACKEND": "http",
+        "TTS_HTTP_URL": f"{base_url}/tts",
+        "STT_BACKEND": "http",
+        "STT_HTTP_URL": f"{base_url}/stt",
+        # Model weights must come from the local cache, never the hub
+        "HF_HUB_OFFLINE": "1",
+        "TRANSFORMERS_OFFLINE": "1",
+    }
+
+
+class StubServer:
+    def __init__(self, port=0, latency_ms=150.0, token_ms=15.0, jitter_ms=30.0, fixtures=FIXTURES, seed=7):
+        with open(fixtures, encoding="utf-8") as f:
+            self.fixtures = json.load(f)
+        self.latency = latency_ms / 1000
+        self.token_delay = token_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.requests = {}
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True).start()
+        return self
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def delay(self, base):
+        with self.rng_lock:
+            jitter = self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        time.sleep(max(0.0, base + jitter))
+
+    def pick(self, items, key):
+        """Deterministic choice per request key, so the same prompt always gets the same reply."""
+        return items[int(hashlib.sha256(key.encode("utf-8")).hexdigest(), 16) % len(items)]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _send(self, status, body=b"", content_type="application/json", headers=None):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _count(self, route):
+                with stub.rng_lock:
+                    stub.requests[route] = stub.requests.get(route, 0) + 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/weather/current.json":
+                    self._count("weather")
+                    stub.delay(stub.latency)
+                    city = parse_qs(url.query).get("q", ["Jalandhar"])[0]
+                    weather = json.loads(json.dumps(stub.fixtures["weather"]))
+                    weather["location"]["name"] = city
+                    self._send(200, weather)
+                elif url.path == "/quotes/random":
+                    self._count("quotes")
+                    stub.delay(stub.latency)
+                    self._send(200, [stub.pick(stub.fixtures["quotes"], time.strftime("%Y-%m-%d"))])
+                elif url.path.startswith("/lottie/") and url.path[len("/lottie/"):-len(".json")] in MOODS:
+                    self._count("lottie")
+                    mood = url.path[len("/lottie/"):-len(".json")]
+                    etag = f'"{mood}-v1"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self._send(304, headers={"ETag": etag})
+                        return
+                    stub.delay(stub.latency)
+                    animation = {"v": "5.7.4", "fr": 30, "ip": 0, "op": 60, "w": 100, "h": 100, "nm": mood, "layers": []}
+                    self._send(200, animation, headers={"ETag": etag})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                body = self._body()
+                if url.path == "/openrouter/chat/completions":
+                    self._count("chat")
+                    self._chat(json.loads(body or b"{}"))
+                elif url.path == "/tts":
+                    self._count("tts")
+                    text = json.loads(body or b"{}").get("text", "")
+                    stub.delay(stub.latency + stub.token_delay * len(text.split()))
+                    # Roughly 1 KB of 32 kbps MP3 per word, as frame headers with silent payloads
+                    frame = b"\xff\xfb\x50\xc4" + b"\x00" * 140
+                    self._send(200, frame * (7 * max(1, len(text.split()))), content_type="audio/mpeg")
+                elif url.path == "/stt":
+                    self._count("stt")
+                    # Recognition time grows with the audio length (16 kHz, 16-bit mono)
+                    stub.delay(stub.latency + len(body) / 32000 * 0.1)
+                    self._send(200, {"text": stub.pick(stub.fixtures["transcripts"], hashlib.sha256(body).hexdigest())})
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def _chat(self, request):
+                messages = request.get("messages") or [{}]
+                reply = stub.pick(stub.fixtures["chat_replies"], str(messages[-1].get("content", "")))
+                stub.delay(stub.latency)
+                if not request.get("stream"):
+                    self._send(200, {"choices": [{"message": {"role": "assistant", "content": reply}}]})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                words = reply.split(" ")
+                for i, word in enumerate(words):
+                    token = word if i == 0 else " " + word
+                    chunk = {"choices": [{"delta": {"content": token}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    stub.delay(stub.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=150.0, help="time before the first byte of a response")
+    parser.add_argument("--token-ms", type=float, default=15.0, help="delay between streamed chat tokens")
+    parser.add_argument("--jitter-ms", type=float, default=30.0, help="uniform +/- jitter on every delay")
+    parser.add_argument("--fixtures", default=FIXTURES)
+    args = parser.parse_args()
+
+    server = StubServer(args.port, args.latency_ms, args.token_ms, args.jitter_ms, args.fixtures).start()
+    for name, value in stub_env(server.base_url).items():
+        print(f"export {name}={value}")
+    # Machine-readable line for harnesses that start the stubs as a subprocess
+    print(f"READY {server.base_url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.close()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
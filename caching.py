@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
+
+
+class LRUCache:
+    """Small thread-safe least-recently-used cache."""
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            if key not in self.data:
+                return default
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def put(self, key: Hashable, value: Any):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.data
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.data)
+
+
+class TTLCache:
+    """Thread-safe cache whose entries go stale after a TTL but are kept for fallback.
+
+    `get_or_load` coalesces concurrent loads of the same key into one call. With
+    `serve_stale`, an expired value is returned immediately and at most one
+    background refresh per key runs at a time. If the loader fails, the stale
+    value is served as fresh for `retry_after` seconds before the next attempt.
+    """
+    def __init__(self, ttl: float, maxsize: int = 256, retry_after: float = 30.0):
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.entries = LRUCache(maxsize)
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.refreshing = set()
+
+    def get(self, key: Hashable) -> Tuple[Any, bool]:
+        """Returns (value, is_fresh); value is None when nothing was ever cached."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, False
+        value, expires_at = entry
+        return value, time.monotonic() < expires_at
+
+    def put(self, key: Hashable, value: Any, ttl: float = None):
+        self.entries.put(key, (value, time.monotonic() + (self.ttl if ttl is None else ttl)))
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: float = None, serve_stale: bool = False) -> Any:
+        value, fresh = self.get(key)
+        if fresh:
+            return value
+        if value is not None and serve_stale:
+            with self.lock:
+                if key in self.refreshing:
+                    return value
+                self.refreshing.add(key)
+            threading.Thread(target=self._load_quietly, args=(key, loader, ttl), daemon=True).start()
+            return value
+        try:
+            return self._load(key, loader, ttl)
+        except Exception:
+            if value is not None:
+                return value
+            raise
+
+    def _load_quietly(self, key, loader, ttl):
+        try:
+            self._load(key, loader, ttl)
+        except Exception as e:
+            print(f"Background refresh of {key!r} failed, keeping the stale value: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def _load(self, key, loader, ttl):
+        with self.lock:
+            key_lock = self.loading.setdefault(key, threading.Lock())
+        with key_lock:
+            # Another caller may have finished the same load while we waited
+            stale, fresh = self.get(key)
+            if fresh:
+                return stale
+            try:
+                value = loader()
+            except Exception:
+                if stale is not None:
+                    # Back off instead of retrying the broken source on every read
+                    self.put(key, stale, self.retry_after)
+                raise
+            self.put(key, value, ttl)
+            return value
@@ -0,0 +1,131 @@
+import hashlib
+import io
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Tuple
+
+from ai_models import ImageCaptionModel, CAPTION_FALLBACK, CAPTION_UNAVAILABLE
+from caching import LRUCache
+from config import (CAPTION_BATCH_SIZE, CAPTION_BATCH_WAIT_MS, CAPTION_WORKERS,
+                    CAPTION_CACHE_SIZE, CAPTION_MAX_SIDE)
+from resources import get_registry
+from startup import lazy_import
+from telemetry import span
+
+_STOP = object()
+
+
+class CaptionService:
+    """Queues caption requests from every session and runs them in micro-batches.
+
+    Uploads are downscaled before preprocessing and cached by content hash, so a
+    re-uploaded image never reaches the model. Requests arriving within
+    `batch_wait_ms` of each other (up to `batch_size`) share one `generate` call
+    on a bounded worker pool.
+    """
+    def __init__(self, batch_size: int = CAPTION_BATCH_SIZE, batch_wait_ms: float = CAPTION_BATCH_WAIT_MS,
+                 workers: int = CAPTION_WORKERS, cache_size: int = CAPTION_CACHE_SIZE, max_side: int = CAPTION_MAX_SIDE):
+        self.model = get_registry().acquire("image_model", ImageCaptionModel)
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.max_side = max_side
+        self.cache = LRUCache(cache_size)
+        self.inflight = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        # Holding a slot per running batch keeps requests queueing (and batching) while workers are busy
+        self.slots = threading.BoundedSemaphore(workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="caption")
+        self.batcher = threading.Thread(target=self._batch_loop, name="caption-batcher", daemon=True)
+        self.batcher.start()
+
+    def submit(self, image_bytes: bytes) -> Future:
+        """Returns a future resolving to the caption of the encoded image."""
+        key = hashlib.sha256(image_bytes).hexdigest()
+        caption = self.cache.get(key)
+        if caption is not None:
+            future = Future()
+            future.set_result(caption)
+            return future
+        with self.lock:
+            # Identical images submitted concurrently share a single request
+            if key in self.inflight:
+                return self.inflight[key]
+            future = Future()
+            self.inflight[key] = future
+        self.queue.put((key, image_bytes, future))
+        return future
+
+    def close(self):
+        self.queue.put(_STOP)
+        self.batcher.join(timeout=5)
+        self.executor.shutdown(wait=True)
+        get_registry().release("image_model")
+
+    def _batch_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self.queue.put(_STOP)
+                    break
+                batch.append(item)
+            self.slots.acquire()
+            self.executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, batch: List[Tuple[str, bytes, Future]]):
+        try:
+            images, pending = [], []
+            for key, image_bytes, future in batch:
+                try:
+                    images.append(self._prepare(image_bytes))
+                    pending.append((key, future))
+                except Exception as e:
+                    print(f"Error decoding uploaded image: {e}")
+                    self._resolve(key, future, CAPTION_FALLBACK, cache=False)
+            if images:
+                if not self.model.model_loaded:
+                    self.model.load_model()
+                if self.model.model_loaded:
+                    with span("caption.batch", images=len(images)):
+                        captions, cache = self.model.caption_images(images), True
+                else:
+                    captions, cache = [CAPTION_UNAVAILABLE] * len(images), False
+                for (key, future), caption in zip(pending, captions):
+                    self._resolve(key, future, caption, cache=cache)
+        except Exception as e:
+            for key, _, future in batch:
+                if not future.done():
+                    self._resolve(key, future, CAPTION_FALLBACK, cache=False)
+            print(f"Error captioning image batch: {e}")
+        finally:
+            self.slots.release()
+
+    def _prepare(self, image_bytes: bytes):
+        """Decodes and shrinks the upload to the model's input scale before preprocessing."""
+        image = lazy_import("PIL.Image").open(io.BytesIO(image_bytes))
+        # Lets the JPEG decoder skip straight to a reduced scale instead of decoding every pixel
+        image.draft("RGB", (self.max_side, self.max_side))
+        image = image.convert("RGB")
+        image.thumbnail((self.max_side, self.max_side))
+        return image
+
+    def _resolve(self, key: str, future: Future, caption: str, cache: bool = True):
+        if cache:
+            self.cache.put(key, caption)
+        with self.lock:
+            self.inflight.pop(key, None)
+        future.set_result(caption)
@@ -9,24 +9,151 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", "") 
 
 # --- API Endpoints ---
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
-WEATHER_API_URL = "http://api.weatherapi.com/v1/current.json"
+# Each can be overridden from the environment, e.g. to point at the offline stubs in benchmarks/stubs.py
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "http://api.weatherapi.com/v1/current.json")
+QUOTE_API_URL = os.getenv("QUOTE_API_URL", "https://zenquotes.io/api/random")
+LOTTIE_BASE_URL = os.getenv("LOTTIE_BASE_URL", "") # If set, moods load from <base>/<mood>.json
+
+# --- HTTP Client Configuration ---
+HTTP_POOL_SIZE = 20 # Keep-alive connections kept per host
+HTTP_HOST_POOLS = 32 # Hosts whose pools are kept at once (OpenRouter, WeatherAPI, zenquotes, 5 Lottie CDNs, TTS/STT, ...)
+# (connect, read) timeouts in seconds per endpoint; the read timeout applies between streamed chunks
+HTTP_TIMEOUTS = {
+    "openrouter": (3.05, 30),
+    "weather": (3.05, 5),
+    "quotes": (3.05, 5),
+    "lottie": (3.05, 5),
+    "tts": (3.05, 10),
+    "stt": (3.05, 15),
+    "default": (3.05, 10),
+}
+HTTP_MAX_RETRIES = 2 # Retries on 429, 5xx and connection errors (POSTs only when the connection was never made)
+HTTP_BACKOFF_BASE = 0.5
+HTTP_BACKOFF_MAX = 4.0
+CIRCUIT_FAILURE_THRESHOLD = 5 # Consecutive failures before an endpoint is short-circuited
+CIRCUIT_RESET_SECONDS = 30
 
 # --- AI Model Configuration ---
 DEFAULT_MODEL = "mistralai/mistral-7b-instruct:free"
 
+# --- Turn Pipeline Configuration ---
+PIPELINE_STAGE_WORKERS = 8 # Threads for stages that run alongside each other within a turn (memory retrieval)
+PIPELINE_BACKGROUND_WORKERS = 4 # Threads for post-response work; each session's tasks still run in order
+
+# --- Prompt Configuration ---
+PROMPT_TOKEN_BUDGET = 3000 # Tokens for system prefix, memories, history and the new message (the reply's 500 come on top)
+PROMPT_SUMMARY_TOKENS = 200 # Reserved for the rolling summary of turns that no longer fit verbatim
+PROMPT_SUMMARY_SOURCE_MESSAGES = 20 # How many of those older messages the summary draws from
+# Hugging Face tokenizer matching DEFAULT_MODEL, loaded from the local HF cache by the warm-up thread (never
+# downloaded by the app; see prompting.TokenCounter). Prompt tokens are estimated until it is loaded.
+PROMPT_TOKENIZER = os.getenv("PROMPT_TOKENIZER", "mistralai/Mistral-7B-Instruct-v0.1")
+
 # --- App Configuration ---
 APP_NAME = "Anjali - Your AI Companion"
 APP_VERSION = "2.0.0"
 YOUR_CITY = "Jalandhar" # Change this to your city for weather updates
 
+# --- Daily Briefing Configuration ---
+WEATHER_CACHE_TTL = 15 * 60 # Seconds a city's weather is served from cache before it is refetched
+BRIEFING_SCHEDULER_ENABLED = True # Precompute the briefing every morning so the button never waits
+BRIEFING_TIME = "07:00" # Local time (HH:MM) users usually ask for their briefing
+BRIEFING_PRECOMPUTE_MINUTES = 10 # How long before BRIEFING_TIME the sources are fetched
+
+# --- Startup Configuration ---
+WARMUP_ON_STARTUP = True # Import the heavy modules on a background thread after the first render
+WARMUP_MODULES = ["chromadb", "torch", "transformers", "gtts", "speech", "speech_recognition"]
+SHOW_STARTUP_REPORT = False # Show per-module import cost in the sidebar
+
+# --- Telemetry Configuration ---
+TELEMETRY_ENABLED = True # Per-stage latency histograms; near-zero cost when turned off
+TELEMETRY_JSON_LOGS = False # Also log every timed stage as one JSON line on stderr
+TELEMETRY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0) # Seconds
+TELEMETRY_SAMPLE_WINDOW = 1024 # Recent samples per stage kept for p50/p95/p99
+METRICS_PORT = None # e.g. 9464 to serve Prometheus text at http://host:9464/metrics
+SHOW_METRICS_PANEL = False # Latency panel in the sidebar for admins
+
+# --- Image Captioning Configuration ---
+CAPTION_MODEL_NAME = "Salesforce/blip-image-captioning-base"
+# "torch" (fp32), "torch-int8" (dynamic int8), "onnx" (ONNX Runtime encoder) or "onnx-int8" (both)
+# Compare them with: python benchmarks/bench_caption.py <image dir>
+CAPTION_BACKEND = "torch"
+CAPTION_MODEL_CACHE_DIR = "./cache/blip" # Exported ONNX graphs are kept here
+CAPTION_BATCH_SIZE = 4 # Max images sharing one generate call
+CAPTION_BATCH_WAIT_MS = 25 # How long the first queued image waits for others to join its batch
+CAPTION_WORKERS = 1 # Concurrent batches; on CPU, torch already spreads one batch across cores
+CAPTION_CACHE_SIZE = 256 # Captions remembered by image content hash
+CAPTION_MAX_SIDE = 384 # Uploads are downscaled to BLIP's input resolution before preprocessing
+CAPTION_TIMEOUT = 60 # Seconds a turn waits for its caption
+
+# --- Voice Configuration ---
+# "gtts" (Google Translate TTS) or "http": POST {"text", "lang", "tld"} to TTS_HTTP_URL, MP3 bytes back
+TTS_BACKEND = os.getenv("TTS_BACKEND", "gtts")
+TTS_HTTP_URL = os.getenv("TTS_HTTP_URL", "")
+TTS_LANG = "en"
+TTS_TLD = "com" # gTTS accent, e.g. "co.in" for Indian English
+TTS_CACHE_DIR = "./cache/tts" # One MP3 per spoken sentence, keyed by hash of (text, lang, tld)
+TTS_CACHE_MAX_MB = 100 # Least recently used clips are deleted beyond this
+TTS_WORKERS = 4 # Sentences synthesized concurrently
+TTS_MAX_CHUNK_CHARS = 200 # Longer sentences are split at commas or spaces
+# "google" (online, default), the offline "vosk" / "whisper" engines if installed, or
+# "http": POST 16 kHz WAV to STT_HTTP_URL, {"text": ...} back
+# Compare them with: python benchmarks/bench_stt.py [recordings dir] [--stub]
+STT_BACKEND = os.getenv("STT_BACKEND", "google")
+STT_HTTP_URL = os.getenv("STT_HTTP_URL", "")
+STT_LANGUAGE = "en-US"
+STT_SAMPLE_RATE = 16000 # Recordings are resampled to 16 kHz mono 16-bit PCM before recognition
+STT_MAX_SECONDS = 30 # Longer recordings are cut off after trimming
+STT_VAD_FRAME_MS = 30
+STT_VAD_THRESHOLD_DB = -35 # Frames this far below the loudest one count as silence
+STT_VAD_FLOOR_DB = -50 # ...and frames below this absolute level (dBFS) always do
+STT_VAD_PADDING_MS = 200 # Kept around the detected speech so word onsets survive
+STT_VOSK_MODEL_PATH = "./models/vosk-model-small-en-us-0.15"
+STT_WHISPER_MODEL = "base.en"
+
 # --- Database Configuration ---
+DEFAULT_USER_ID = "default" # Used when nobody is logged in
+# Memories are kept per logged-in user (Streamlit's st.login / st.user, configured under [auth] in secrets.toml).
+# ALLOW_QUERY_USER also lets ?user=<id> pick the user when nobody is logged in. That is for local testing only:
+# anyone can type another id into the URL, so it provides NO isolation between users.
+ALLOW_QUERY_USER = os.getenv("ALLOW_QUERY_USER", "").lower() in ("1", "true", "yes")
 DB_PATH = "anjali_memory.db"
+# Users are spread over this many SQLite files by a hash of their id (1 keeps everything in DB_PATH).
+# Pick it before the first multi-user run: changing it later moves users to other files.
+DB_SHARDS = 1
 CHROMA_PERSIST_DIR = "./chroma_db"
+SQLITE_READ_POOL_SIZE = 4 # Pooled read connections shared by all sessions
+SQLITE_WRITE_BATCH_SIZE = 100 # Queued writes committed together in one transaction
+SQLITE_WRITE_BATCH_WAIT_MS = 50 # Max delay before queued writes are committed
+SQLITE_CACHE_SIZE_KB = 16384
+SQLITE_BUSY_TIMEOUT_MS = 5000
+MEMORY_DUPLICATE_DISTANCE = 0.05 # Cosine distance under which a new memory counts as a near-duplicate
+RETRIEVAL_CACHE_SIZE = 512 # Cached query embeddings and result lists
+RETRIEVAL_MAX_DISTANCE = 0.6 # Vector hits further than this (cosine) are ignored
+RETRIEVAL_LEXICAL_CONFIDENCE = 1.0 # Share of non-trigger query terms a full-text hit needs to skip the vector search
+RETRIEVAL_RECENCY_HALF_LIFE_DAYS = 30
+RETRIEVAL_WEIGHTS = {"relevance": 0.6, "importance": 0.25, "recency": 0.15} # Re-ranking blend
+
+# --- Memory Consolidation Configuration ---
+CONSOLIDATION_ENABLED = True # Run the background merge/evict job inside the app process
+CONSOLIDATION_BATCH_SIZE = 50 # Memories examined per checkpointed step
+CONSOLIDATION_NEIGHBORS = 5 # Nearest neighbours checked for each memory
+CONSOLIDATION_MERGE_DISTANCE = 0.12 # Cosine distance under which memories are merged into one
+CONSOLIDATION_STEP_PAUSE = 1.0 # Seconds between steps, keeps the job from competing with live turns
+CONSOLIDATION_INTERVAL = 30 * 60 # Seconds between full passes
+MEMORY_CAP_PER_USER = 5000 # Lowest-value memories beyond this are evicted
+MEMORY_DECAY_HALF_LIFE_DAYS = 90 # Age at which a memory's value for eviction has halved
+
+# --- Memory Maintenance CLI (memory_cli.py) ---
+MEMORY_EXPORT_CHUNK = 1000 # Rows fetched and written per chunk (one Parquet row group each)
+MEMORY_REINDEX_BATCH = 256 # Memories embedded per call and checkpointed per step while rebuilding Chroma
+MEMORY_BACKFILL_BATCH = 500 # Conversation turns scanned per checkpointed backfill step
 
 # --- UI Configuration ---
 ANJALI_AVATAR = "👩‍💼"
 USER_AVATAR = "👤"
+CHAT_WINDOW_SIZE = 30 # Messages rendered per rerun; "Load older" extends the window by this much
+CHAT_HISTORY_PAGE_SIZE = 50 # Conversation rows fetched from SQLite per page
 
 # Lottie animations for different moods
 LOTTIE_ASSETS = {
@@ -36,6 +163,10 @@ LOTTIE_ASSETS = {
     "supportive": "https://assets10.lottiefiles.com/packages/lf20_xXfBcf.json",
     "thinking": "https://assets4.lottiefiles.com/packages/lf20_e2mSFn.json"
 }
+if LOTTIE_BASE_URL:
+    LOTTIE_ASSETS = {mood: f"{LOTTIE_BASE_URL.rstrip('/')}/{mood}.json" for mood in LOTTIE_ASSETS}
+LOTTIE_CACHE_DIR = "./cache/lottie"
+LOTTIE_REVALIDATE_SECONDS = 6 * 60 * 60 # How often cached animations are revalidated in the background
 
 # --- Personality & Moods ---
 ANJALI_PERSONALITY = """You are Anjali, a caring, intelligent, and emotionally aware AI companion. You are warm, supportive, and genuinely interested in the person you're talking to. You remember details about conversations and use them to build a deeper connection. You express emotions naturally using emojis and caring language. You are romantic when appropriate, playful when the mood is light, and supportive when needed. At the end of your response, you MUST provide a sentiment score for the user's last message on a new line, like this: [sentiment: positive]. The possible values are positive, neutral, or negative."""
@@ -0,0 +1,148 @@
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+from config import (CONSOLIDATION_BATCH_SIZE, CONSOLIDATION_NEIGHBORS, CONSOLIDATION_MERGE_DISTANCE,
+                    CONSOLIDATION_STEP_PAUSE, CONSOLIDATION_INTERVAL, MEMORY_CAP_PER_USER,
+                    MEMORY_DECAY_HALF_LIFE_DAYS)
+
+JOB = "consolidation"
+
+
+class MemoryConsolidator:
+    """Merges near-duplicate memories and keeps one user's store under `MEMORY_CAP_PER_USER`.
+
+    Work is done in small steps over memories in id order. After each step the
+    last processed id is checkpointed in `maintenance_state`, so an interrupted
+    pass resumes where it stopped. A finished pass evicts the lowest-value
+    memories (importance decayed by age) from SQLite and Chroma together.
+    """
+    def __init__(self, db, batch_size: int = CONSOLIDATION_BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Runs passes on a daemon thread until `close()`."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._loop, name="memory-consolidation", daemon=True)
+            self.thread.start()
+
+    def close(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            try:
+                finished = self.run_step()
+            except Exception as e:
+                print(f"Memory consolidation step failed: {e}")
+                finished = True
+            self.stopping.wait(CONSOLIDATION_INTERVAL if finished else CONSOLIDATION_STEP_PAUSE)
+
+    def run_pass(self):
+        """Runs steps until the current pass completes (used by the CLI entry point)."""
+        while not self.run_step() and not self.stopping.is_set():
+            pass
+
+    def run_step(self) -> bool:
+        """Consolidates the next batch after the checkpoint. Returns True when the pass is complete."""
+        state = self.db.get_job_state(JOB, {"last_id": 0, "merged": 0})
+        rows = self.db.store.fetchall('SELECT id, memory_type, importance, vector_id FROM memories '
+                                      'WHERE user_id = ? AND id > ? AND vector_id IS NOT NULL ORDER BY id LIMIT ?',
+                                      (self.db.user_id, state["last_id"], self.batch_size))
+        if not rows:
+            evicted = self.evict_over_cap()
+            summary = {"finished_at": str(datetime.now()), "merged": state["merged"], "evicted": evicted}
+            self.db.set_job_state(JOB, {"last_id": 0, "merged": 0, "last_pass": summary})
+            self.db.flush()
+            return True
+
+        state["merged"] += self._merge_batch(rows)
+        state["last_id"] = rows[-1][0]
+        self.db.set_job_state(JOB, state)
+        self.db.flush()
+        return False
+
+    def _merge_batch(self, rows) -> int:
+        collection = self.db.collection
+        vector_ids = [row[3] for row in rows]
+        stored = collection.get(ids=vector_ids, include=["embeddings"])
+        embeddings = dict(zip(stored["ids"], stored["embeddings"]))
+        present = [vector_id for vector_id in vector_ids if vector_id in embeddings]
+        if not present or collection.count() < 2:
+            return 0
+        neighbours = collection.query(query_embeddings=[embeddings[v] for v in present],
+                                      n_results=min(CONSOLIDATION_NEIGHBORS + 1, collection.count()),
+                                      include=["distances"])
+
+        removed, merged = set(), 0
+        for vector_id, ids, distances in zip(present, neighbours["ids"], neighbours["distances"]):
+            if vector_id in removed:
+                continue
+            cluster = {vector_id} | {other for other, distance in zip(ids, distances)
+                                     if other not in removed and distance <= CONSOLIDATION_MERGE_DISTANCE}
+            if len(cluster) > 1:
+                removed |= self._merge_cluster(cluster)
+                merged += 1
+        return merged
+
+    def _merge_cluster(self, vector_ids) -> set:
+        """Keeps the most important (then newest) memory of the cluster and folds the rest into it."""
+        placeholders = ",".join("?" * len(vector_ids))
+        members = self.db.store.fetchall(f'SELECT id, memory_type, importance, vector_id, created_at FROM memories '
+                                         f'WHERE user_id = ? AND vector_id IN ({placeholders})', (self.db.user_id, *vector_ids))
+        if len(members) < 2:
+            return set()
+        members.sort(key=lambda row: (row[2] or 0, row[4] or "", row[0]), reverse=True)
+        keeper, duplicates = members[0], members[1:]
+
+        types = _merge_types(member[1] for member in members)
+        # Something said repeatedly matters a bit more than any single mention
+        importance = min(10, (keeper[2] or 0) + 1)
+        self.db.store.write('UPDATE memories SET memory_type = ?, importance = ? WHERE id = ?', (types, importance, keeper[0]))
+        self.db.collection.update(ids=[keeper[3]], metadatas=[{"type": types, "importance": importance}])
+        self.db.delete_memories([(row[0], row[3]) for row in duplicates])
+        return {row[3] for row in duplicates}
+
+    def evict_over_cap(self, cap: int = MEMORY_CAP_PER_USER) -> int:
+        """Deletes the lowest-value memories beyond the cap, in batches. Returns how many went."""
+        evicted = 0
+        excess = self.db.store.fetchone('SELECT COUNT(*) FROM memories WHERE user_id = ?', (self.db.user_id,))[0] - cap
+        while excess > 0 and not self.stopping.is_set():
+            # Hyperbolic decay keeps the ranking in plain SQL: value halves once a memory is a half-life old
+            rows = self.db.store.fetchall('SELECT id, vector_id FROM memories WHERE user_id = ? ORDER BY importance / '
+                                          '(1.0 + (julianday(\'now\', \'localtime\') - julianday(created_at)) / ?) ASC, id ASC LIMIT ?',
+                                          (self.db.user_id, MEMORY_DECAY_HALF_LIFE_DAYS, min(excess, self.batch_size)))
+            if not rows:
+                break
+            self.db.delete_memories(rows)
+            self.db.flush()
+            evicted += len(rows)
+            excess -= len(rows)
+        return evicted
+
+
+def _merge_types(memory_types) -> str:
+    merged: List[str] = []
+    for memory_type in memory_types:
+        for tag in (memory_type or "").split(","):
+            if tag and tag not in merged:
+                merged.append(tag)
+    return ",".join(merged) or "general"
+
+
+if __name__ == "__main__":
+    import sys
+    from config import DEFAULT_USER_ID
+    from database import MemoryDatabase
+    # python consolidation.py [user id]
+    db = MemoryDatabase(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_USER_ID)
+    consolidator = MemoryConsolidator(db)
+    consolidator.run_pass()
+    summary: Dict = db.get_job_state(JOB, {}).get("last_pass", {})
+    print(f"Consolidation pass finished: {summary.get('merged', 0)} clusters merged, {summary.get('evicted', 0)} memories evicted")
+    db.close()
@@ -1,81 +1,385 @@
-import sqlite3
+import hashlib
 import json
+import math
+import os
+import sqlite3
 from datetime import datetime
-import chromadb
-from chromadb.config import Settings
+import threading
 import uuid
-from config import DB_PATH, CHROMA_PERSIST_DIR, RELATIONSHIP_LEVELS
+from caching import LRUCache
+from config import (DB_PATH, DB_SHARDS, DEFAULT_USER_ID, CHROMA_PERSIST_DIR, RELATIONSHIP_LEVELS,
+                    MEMORY_DUPLICATE_DISTANCE)
+from resources import SessionResources
+from storage import SQLiteStore
+from startup import lazy_import
+from telemetry import span
 
-class MemoryDatabase:
-    def __init__(self):
-        self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        self.cursor = self.conn.cursor()
+
+MEMORY_COLLECTION = "anjali_memories"
+
+def collection_name(user_id):
+    """The default user keeps the original collection, so single-user installs keep their memories"""
+    if user_id == DEFAULT_USER_ID:
+        return MEMORY_COLLECTION
+    return f"{MEMORY_COLLECTION}_{hashlib.sha256(user_id.encode('utf-8')).hexdigest()[:16]}"
+
+class MemoryIndex:
+    """Chroma client and embedding function shared by every session, with one collection per user."""
+    def __init__(self, path=CHROMA_PERSIST_DIR):
+        chromadb = lazy_import("chromadb")
+        settings = lazy_import("chromadb.config").Settings(anonymized_telemetry=False)
+        self.client = chromadb.PersistentClient(path=path, settings=settings)
+        self.embedding_function = lazy_import("chromadb.utils.embedding_functions").DefaultEmbeddingFunction()
+        self.lock = threading.Lock()
+        self.collections = {}
+
+    def collection(self, user_id=DEFAULT_USER_ID):
+        collection = self.collections.get(user_id)
+        if collection is None:
+            with self.lock:
+                collection = self.collections.get(user_id)
+                if collection is None:
+                    collection = self.collections[user_id] = self._open_collection(user_id)
+        return collection
+
+    def _open_collection(self, user_id):
+        return self.client.get_or_create_collection(name=collection_name(user_id), metadata={"hnsw:space": "cosine"},
+                                                    embedding_function=self.embedding_function)
+
+    def reset(self, user_id=DEFAULT_USER_ID):
+        """Drops and recreates one user's collection; every session of that user sees the new one."""
+        with self.lock:
+            try:
+                self.client.delete_collection(collection_name(user_id))
+            except Exception:
+                pass # Nothing was ever stored for this user
+            self.collections[user_id] = self._open_collection(user_id)
+
+def memory_vector_id(user_id, content_hash):
+    """Chroma id of a memory, derived from its owner and normalized text so both stores agree on it across rebuilds"""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"anjali:{user_id}:{content_hash}"))
+
+def memory_hash(text):
+    """Hash of the text with case and whitespace normalized, used to skip exact repeats"""
+    return hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).hexdigest()
+
+def cosine_distance(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return 1 - dot / norm if norm else 1.0
+
+def shard_path(user_id, path=DB_PATH, shards=DB_SHARDS):
+    """The SQLite file holding this user's rows: one of `shards` files picked by a hash of the id"""
+    if shards <= 1:
+        return path
+    shard = int(hashlib.sha256(user_id.encode("utf-8")).hexdigest(), 16) % shards
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard}{ext}"
+
+
+USER_INFO_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        user_id TEXT NOT NULL, key TEXT NOT NULL, value TEXT, PRIMARY KEY (user_id, key)
+    )'''
+RELATIONSHIP_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        user_id TEXT PRIMARY KEY, interaction_count INTEGER DEFAULT 0, positive_interactions INTEGER DEFAULT 0,
+        negative_interactions INTEGER DEFAULT 0, relationship_points INTEGER DEFAULT 0
+    )'''
+MAINTENANCE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        user_id TEXT NOT NULL, job TEXT NOT NULL, value TEXT, PRIMARY KEY (user_id, job)
+    )'''
+
+class MemoryShard:
+    """One SQLite file with the schema for every user hashed to it.
+
+    Each shard has its own store, writer thread and file lock, so users on
+    different shards never wait on each other. Shared by every session whose
+    user lives in it.
+    """
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.store = SQLiteStore(path)
         self.init_sqlite()
-        self.init_chromadb()
+
+    def close(self):
+        self.store.close()
+
+    def _columns(self, table):
+        return {row[1] for row in self.store.fetchall(f"PRAGMA table_info({table})")}
 
     def init_sqlite(self):
         """Initialize SQLite database for structured memory and relationship storage"""
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_info (
-                key TEXT PRIMARY KEY, value TEXT
-            )''')
-        self.cursor.execute('''
+        self.store.execute_now([
+            (USER_INFO_TABLE.format(name="user_info"), ()),
+            (f'''
             CREATE TABLE IF NOT EXISTS conversations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, role TEXT, content TEXT, timestamp TIMESTAMP, mood TEXT
-            )''')
-        self.cursor.execute('''
+                id INTEGER PRIMARY KEY AUTOINCREMENT, role TEXT, content TEXT, timestamp TIMESTAMP, mood TEXT,
+                user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'
+            )''', ()),
+            (f'''
             CREATE TABLE IF NOT EXISTS memories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, memory_type TEXT, content TEXT, importance INTEGER, created_at TIMESTAMP, context TEXT
-            )''')
-        # New table for relationship tracking
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS relationship_metrics (
-                id INTEGER PRIMARY KEY, interaction_count INTEGER DEFAULT 0, positive_interactions INTEGER DEFAULT 0,
-                negative_interactions INTEGER DEFAULT 0, relationship_points INTEGER DEFAULT 0
-            )''')
-        # Ensure a single row exists for metrics
-        self.cursor.execute("INSERT OR IGNORE INTO relationship_metrics (id) VALUES (1)")
-        self.conn.commit()
-
-    def init_chromadb(self):
-        """Initialize ChromaDB for semantic memory search"""
-        self.chroma_client = chromadb.PersistentClient(path=CHROMA_PERSIST_DIR, settings=Settings(anonymized_telemetry=False))
-        self.collection = self.chroma_client.get_or_create_collection(name="anjali_memories", metadata={"hnsw:space": "cosine"})
+                id INTEGER PRIMARY KEY AUTOINCREMENT, memory_type TEXT, content TEXT, importance INTEGER, created_at TIMESTAMP, context TEXT,
+                user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'
+            )''', ()),
+            # Relationship tracking, one row per user
+            (RELATIONSHIP_TABLE.format(name="relationship_metrics"), ()),
+            # Checkpoints for resumable background jobs
+            (MAINTENANCE_TABLE.format(name="maintenance_state"), ()),
+        ])
+        self.migrate_users()
+        self.store.execute_now([
+            # Back the per-user keyset-paginated history queries
+            ("DROP INDEX IF EXISTS idx_conversations_timestamp", ()),
+            ("DROP INDEX IF EXISTS idx_memories_created_importance", ()),
+            ("CREATE INDEX IF NOT EXISTS idx_conversations_user_timestamp ON conversations (user_id, timestamp)", ()),
+            ("CREATE INDEX IF NOT EXISTS idx_memories_user_created_importance ON memories (user_id, created_at, importance)", ()),
+        ])
+        self.migrate_memories()
+
+    def migrate_users(self):
+        """Moves tables from before multi-user support over to the default user"""
+        statements = []
+        for table in ("conversations", "memories"):
+            if "user_id" not in self._columns(table):
+                statements.append((f"ALTER TABLE {table} ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'", ()))
+        # These change primary key (key -> user and key, the single id = 1 row -> user), so they are rebuilt
+        if "user_id" not in self._columns("user_info"):
+            statements += _rebuild("user_info", USER_INFO_TABLE, "key, value")
+        if "user_id" not in self._columns("relationship_metrics"):
+            statements += _rebuild("relationship_metrics", RELATIONSHIP_TABLE, "interaction_count, positive_interactions, "
+                                   "negative_interactions, relationship_points", where="WHERE id = 1")
+        if "user_id" not in self._columns("maintenance_state"):
+            statements += _rebuild("maintenance_state", MAINTENANCE_TABLE, "job, value")
+        if statements:
+            self.store.execute_now(statements)
+
+    def migrate_memories(self):
+        """Adds the dedup hash and Chroma id columns to memories tables created before they existed"""
+        columns = self._columns("memories")
+        statements = [(f"ALTER TABLE memories ADD COLUMN {name} TEXT", ())
+                      for name in ("content_hash", "vector_id") if name not in columns]
+        statements += [
+            ("DROP INDEX IF EXISTS idx_memories_content_hash", ()),
+            ("CREATE INDEX IF NOT EXISTS idx_memories_user_content_hash ON memories (user_id, content_hash)", ()),
+        ]
+        self.store.execute_now(statements)
+        self.init_fts()
+
+    def init_fts(self):
+        """Keeps an FTS5 index over memories in sync through triggers, for the lexical prefilter"""
+        exists = self.store.fetchone("SELECT 1 FROM sqlite_master WHERE name = 'memories_fts'")
+        try:
+            self.store.execute_now([
+                ("CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(content, content='memories', content_rowid='id')", ()),
+                ('''CREATE TRIGGER IF NOT EXISTS memories_fts_insert AFTER INSERT ON memories BEGIN
+                    INSERT INTO memories_fts (rowid, content) VALUES (new.id, new.content);
+                END''', ()),
+                ('''CREATE TRIGGER IF NOT EXISTS memories_fts_delete AFTER DELETE ON memories BEGIN
+                    INSERT INTO memories_fts (memories_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END''', ()),
+                ('''CREATE TRIGGER IF NOT EXISTS memories_fts_update AFTER UPDATE OF content ON memories BEGIN
+                    INSERT INTO memories_fts (memories_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    INSERT INTO memories_fts (rowid, content) VALUES (new.id, new.content);
+                END''', ()),
+            ] + ([] if exists else [("INSERT INTO memories_fts (memories_fts) VALUES ('rebuild')", ())]))
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            # SQLite builds without FTS5 simply skip the lexical stage
+            print(f"FTS5 unavailable, memory search will be vector-only: {e}")
+            self.fts_enabled = False
+
+
+def _rebuild(table, schema, columns, where=""):
+    """Statements that copy a legacy table into `schema` under the default user and swap it in"""
+    return [
+        (schema.format(name=f"{table}_migrated"), ()),
+        (f"INSERT INTO {table}_migrated (user_id, {columns}) SELECT ?, {columns} FROM {table} {where}", (DEFAULT_USER_ID,)),
+        (f"DROP TABLE {table}", ()),
+        (f"ALTER TABLE {table}_migrated RENAME TO {table}", ()),
+    ]
+
+class MemoryDatabase:
+    """One user's view of the memory store.
+
+    Rows live in the user's shard (see `shard_path`) and memories in the user's
+    own Chroma collection. Shards and the Chroma client are shared process-wide
+    through the resource registry; reads use pooled connections and writes go
+    through the shard's write-behind queue, so nothing here holds a connection.
+    """
+    def __init__(self, user_id=DEFAULT_USER_ID, resources: SessionResources = None, path=None):
+        self.user_id = user_id
+        self.resources = resources or SessionResources()
+        path = path or shard_path(user_id)
+        self.shard = self.resources.get(f"db_shard:{os.path.abspath(path)}", lambda: MemoryShard(path))
+        self.store = self.shard.store
+        self.recent_hashes = LRUCache(1024)
+        # Bumped on every memory write so retrieval caches know when to drop results
+        self.memory_generation = 0
+        self._index = None
+
+    @property
+    def fts_enabled(self):
+        return self.shard.fts_enabled
+
+    def search_memories_lexical(self, terms, limit=10):
+        """Full-text prefilter: (id, content, importance, created_at, bm25) rows, best match first"""
+        if not self.fts_enabled or not terms:
+            return []
+        match = " OR ".join(f'"{term}"*' for term in terms)
+        return self.store.fetchall('SELECT m.id, m.content, m.importance, m.created_at, bm25(memories_fts) '
+                                   'FROM memories_fts JOIN memories m ON m.id = memories_fts.rowid '
+                                   'WHERE memories_fts MATCH ? AND m.user_id = ? ORDER BY bm25(memories_fts) LIMIT ?',
+                                   (match, self.user_id, limit))
+
+    @property
+    def index(self):
+        """Process-wide ChromaDB index for semantic memory search, attached on first use"""
+        if self._index is None:
+            self._index = self.resources.get("memory_index", MemoryIndex)
+        return self._index
+
+    @property
+    def collection(self):
+        return self.index.collection(self.user_id)
+
+    def flush(self):
+        """Waits until every queued write is committed."""
+        self.store.flush()
+
+    def close(self):
+        # Releases the shard and Chroma client; the last user of a shard closes its store
+        self.resources.close()
 
     def save_user_info(self, key, value):
-        self.cursor.execute('INSERT OR REPLACE INTO user_info (key, value) VALUES (?, ?)', (key, value))
-        self.conn.commit()
+        self.store.write('INSERT OR REPLACE INTO user_info (user_id, key, value) VALUES (?, ?, ?)', (self.user_id, key, value))
 
     def get_user_info(self, key):
-        self.cursor.execute('SELECT value FROM user_info WHERE key = ?', (key,))
-        result = self.cursor.fetchone()
+        result = self.store.fetchone('SELECT value FROM user_info WHERE user_id = ? AND key = ?', (self.user_id, key))
         return result[0] if result else None
 
     def save_conversation(self, role, content, mood="friendly"):
-        self.cursor.execute('INSERT INTO conversations (role, content, timestamp, mood) VALUES (?, ?, ?, ?)', (role, content, datetime.now(), mood))
-        self.conn.commit()
+        self.store.write('INSERT INTO conversations (user_id, role, content, timestamp, mood) VALUES (?, ?, ?, ?, ?)',
+                         (self.user_id, role, content, datetime.now(), mood))
 
     def get_recent_conversations(self, limit=10):
-        self.cursor.execute('SELECT role, content FROM conversations ORDER BY timestamp DESC LIMIT ?', (limit,))
-        return self.cursor.fetchall()
+        return self.store.fetchall('SELECT role, content FROM conversations WHERE user_id = ? '
+                                   'ORDER BY timestamp DESC, id DESC LIMIT ?', (self.user_id, limit))
+
+    def get_conversation_page(self, before=None, limit=50):
+        """Returns up to `limit` (id, role, content, timestamp, mood) rows, newest first.
+
+        `before` is the (timestamp, id) of the oldest row already loaded; pass
+        `conversation_cursor(rows[-1])` to fetch the next older page.
+        """
+        if before is None:
+            return self.store.fetchall('SELECT id, role, content, timestamp, mood FROM conversations WHERE user_id = ? '
+                                       'ORDER BY timestamp DESC, id DESC LIMIT ?', (self.user_id, limit))
+        return self.store.fetchall('SELECT id, role, content, timestamp, mood FROM conversations '
+                                   'WHERE user_id = ? AND (timestamp, id) < (?, ?) ORDER BY timestamp DESC, id DESC LIMIT ?',
+                                   (self.user_id, *before, limit))
+
+    @staticmethod
+    def conversation_cursor(row):
+        return row[3], row[0]
 
     def save_memory(self, content, memory_type="general", importance=5, context=""):
-        memory_id = str(uuid.uuid4())
-        self.cursor.execute('INSERT INTO memories (memory_type, content, importance, created_at, context) VALUES (?, ?, ?, ?, ?)',
-                           (memory_type, content, importance, datetime.now(), context))
-        self.conn.commit()
-        self.collection.add(documents=[content], metadatas=[{"type": memory_type, "importance": importance, "context": context, "timestamp": str(datetime.now())}], ids=[memory_id])
+        return self.save_memories([{"content": content, "types": [memory_type], "importance": importance, "context": context}])
+
+    def save_memories(self, memories):
+        """Stores new memories with one embedding pass and one batched Chroma write.
+
+        Each memory is {"content", "types", "importance", "context"}, plus an optional
+        "created_at" for memories recovered from older conversations. Memories whose
+        normalized text is already stored, or whose embedding is within
+        `MEMORY_DUPLICATE_DISTANCE` of an existing or earlier one, are skipped.
+        Returns the memories that were actually saved.
+        """
+        fresh, seen = [], set()
+        for memory in memories:
+            content_hash = memory_hash(memory["content"])
+            if content_hash not in seen:
+                seen.add(content_hash)
+                fresh.append(dict(memory, content_hash=content_hash))
+        fresh = [m for m in fresh if not self._hash_exists(m["content_hash"])]
+        if not fresh:
+            return []
+
+        with span("memory.embed", memories=len(fresh)):
+            embeddings = [list(map(float, e)) for e in self.index.embedding_function([m["content"] for m in fresh])]
+        keep = self._drop_near_duplicates(embeddings)
+        fresh = [fresh[i] for i in keep]
+        embeddings = [embeddings[i] for i in keep]
+        if not fresh:
+            return []
+
+        now = datetime.now()
+        for memory in fresh:
+            memory["vector_id"] = memory_vector_id(self.user_id, memory["content_hash"])
+            memory.setdefault("created_at", now)
+            memory_type = ",".join(memory["types"])
+            self.store.write('INSERT INTO memories (user_id, memory_type, content, importance, created_at, context, content_hash, vector_id) '
+                             'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                             (self.user_id, memory_type, memory["content"], memory["importance"], memory["created_at"],
+                              memory["context"], memory["content_hash"], memory["vector_id"]))
+            self.recent_hashes.put(memory["content_hash"], True)
+        self.memory_generation += 1
+        with span("memory.index"):
+            self.collection.add(ids=[m["vector_id"] for m in fresh], documents=[m["content"] for m in fresh], embeddings=embeddings,
+                                metadatas=[{"type": ",".join(m["types"]), "importance": m["importance"], "context": m["context"],
+                                            "timestamp": str(m["created_at"])} for m in fresh])
+        return fresh
+
+    def _hash_exists(self, content_hash):
+        # Recently queued inserts may not be committed yet, so check them first
+        if content_hash in self.recent_hashes:
+            return True
+        return self.store.fetchone('SELECT 1 FROM memories WHERE user_id = ? AND content_hash = ? LIMIT 1',
+                                   (self.user_id, content_hash)) is not None
+
+    def _drop_near_duplicates(self, embeddings):
+        """Returns the indexes of embeddings that are not near-duplicates of stored or earlier ones."""
+        keep = []
+        nearest = None
+        if self.collection.count() > 0:
+            nearest = self.collection.query(query_embeddings=embeddings, n_results=1, include=["distances"])["distances"]
+        for i, embedding in enumerate(embeddings):
+            if nearest and nearest[i] and nearest[i][0] < MEMORY_DUPLICATE_DISTANCE:
+                continue
+            if any(cosine_distance(embedding, embeddings[j]) < MEMORY_DUPLICATE_DISTANCE for j in keep):
+                continue
+            keep.append(i)
+        return keep
 
     def search_memories(self, query, n_results=5):
         return self.collection.query(query_texts=[query], n_results=n_results)
 
     def get_all_memories(self):
-        self.cursor.execute('SELECT id, memory_type, content, importance, created_at, context FROM memories ORDER BY created_at DESC')
-        return self.cursor.fetchall()
+        return self.store.fetchall('SELECT id, memory_type, content, importance, created_at, context FROM memories '
+                                   'WHERE user_id = ? ORDER BY created_at DESC', (self.user_id,))
+
+    def get_memory_page(self, before=None, limit=50):
+        """Returns up to `limit` (id, memory_type, content, importance, created_at, context) rows, newest first.
+
+        Follows the (created_at, importance) index order; pass `memory_cursor(rows[-1])`
+        as `before` to fetch the next older page.
+        """
+        if before is None:
+            return self.store.fetchall('SELECT id, memory_type, content, importance, created_at, context FROM memories '
+                                       'WHERE user_id = ? ORDER BY created_at DESC, importance DESC, id DESC LIMIT ?',
+                                       (self.user_id, limit))
+        return self.store.fetchall('SELECT id, memory_type, content, importance, created_at, context FROM memories '
+                                   'WHERE user_id = ? AND (created_at, importance, id) < (?, ?, ?) '
+                                   'ORDER BY created_at DESC, importance DESC, id DESC LIMIT ?', (self.user_id, *before, limit))
+
+    @staticmethod
+    def memory_cursor(row):
+        return row[4], row[3], row[0]
         
     def get_relationship_status(self):
-        self.cursor.execute("SELECT interaction_count, positive_interactions, relationship_points FROM relationship_metrics WHERE id = 1")
-        res = self.cursor.fetchone()
+        res = self.store.fetchone("SELECT interaction_count, positive_interactions, relationship_points FROM relationship_metrics "
+                                  "WHERE user_id = ?", (self.user_id,))
         if not res: return {"level": "Acquaintance", "points": 0}
         
         points = res[2]
@@ -99,26 +403,47 @@ class MemoryDatabase:
         else: # neutral
             points_change = 1
 
-        self.cursor.execute("""
-            UPDATE relationship_metrics
+        # A user's first interaction creates their row
+        self.store.write("""
+            INSERT INTO relationship_metrics (user_id, interaction_count, positive_interactions, negative_interactions, relationship_points)
+            VALUES (?, 1, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE
             SET interaction_count = interaction_count + 1,
-                positive_interactions = positive_interactions + ?,
-                negative_interactions = negative_interactions + ?,
-                relationship_points = relationship_points + ?
-            WHERE id = 1
-        """, (pos_change, neg_change, points_change))
-        self.conn.commit()
+                positive_interactions = positive_interactions + excluded.positive_interactions,
+                negative_interactions = negative_interactions + excluded.negative_interactions,
+                relationship_points = relationship_points + excluded.relationship_points
+        """, (self.user_id, pos_change, neg_change, points_change))
+
+    def get_job_state(self, job, default=None):
+        result = self.store.fetchone('SELECT value FROM maintenance_state WHERE user_id = ? AND job = ?', (self.user_id, job))
+        return json.loads(result[0]) if result else default
+
+    def set_job_state(self, job, value):
+        self.store.write('INSERT OR REPLACE INTO maintenance_state (user_id, job, value) VALUES (?, ?, ?)',
+                         (self.user_id, job, json.dumps(value)))
+
+    def delete_memories(self, rows):
+        """Removes memories from both stores; `rows` are (id, vector_id) pairs"""
+        vector_ids = [vector_id for _, vector_id in rows if vector_id]
+        if vector_ids:
+            self.collection.delete(ids=vector_ids)
+        for memory_id, _ in rows:
+            self.store.write('DELETE FROM memories WHERE id = ? AND user_id = ?', (memory_id, self.user_id))
+        self.memory_generation += 1
 
     def delete_memory(self, memory_id):
-        self.cursor.execute('DELETE FROM memories WHERE id = ?', (memory_id,))
-        self.conn.commit()
+        row = self.store.fetchone('SELECT id, vector_id FROM memories WHERE id = ? AND user_id = ?', (memory_id, self.user_id))
+        if row:
+            self.delete_memories([row])
 
     def clear_all_memories(self):
-        self.cursor.execute('DELETE FROM memories')
-        self.cursor.execute('DELETE FROM conversations')
-        self.cursor.execute('DELETE FROM user_info')
-        # Reset relationship as well
-        self.cursor.execute('UPDATE relationship_metrics SET interaction_count=0, positive_interactions=0, negative_interactions=0, relationship_points=0 WHERE id=1')
-        self.conn.commit()
-        self.chroma_client.delete_collection("anjali_memories")
-        self.init_chromadb()
\ No newline at end of file
+        self.store.execute_now([
+            ('DELETE FROM memories WHERE user_id = ?', (self.user_id,)),
+            ('DELETE FROM conversations WHERE user_id = ?', (self.user_id,)),
+            ('DELETE FROM user_info WHERE user_id = ?', (self.user_id,)),
+            # Reset relationship as well
+            ('DELETE FROM relationship_metrics WHERE user_id = ?', (self.user_id,)),
+        ])
+        self.recent_hashes.clear()
+        self.memory_generation += 1
+        self.index.reset(self.user_id)
@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from config import (HTTP_POOL_SIZE, HTTP_HOST_POOLS, HTTP_TIMEOUTS, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE,
+                    HTTP_BACKOFF_MAX, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through after a cool-down."""
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            # Half-open: let exactly one request find out whether the endpoint recovered
+            self.probing = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class HttpClient:
+    """Keep-alive session with per-endpoint timeouts, jittered retries and circuit breakers.
+
+    `endpoint` is a short name ("openrouter", "weather", ...) used to look up the
+    timeout in `config.HTTP_TIMEOUTS` and to keep a separate breaker per upstream.
+    """
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_HOST_POOLS, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, endpoint: str) -> CircuitBreaker:
+        with self.lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker()
+            return self.breakers[endpoint]
+
+    def get(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        return self.request(endpoint, "GET", url, **kwargs)
+
+    def post(self, endpoint: str, url: str, **kwargs) -> requests.Response:
+        return self.request(endpoint, "POST", url, **kwargs)
+
+    def request(self, endpoint: str, method: str, url: str, **kwargs) -> requests.Response:
+        breaker = self.breaker(endpoint)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for '{endpoint}', skipping {url}")
+        kwargs.setdefault("timeout", HTTP_TIMEOUTS.get(endpoint, HTTP_TIMEOUTS["default"]))
+
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            last_attempt = attempt == HTTP_MAX_RETRIES
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if last_attempt or not self._retryable(method, e):
+                    breaker.record_failure()
+                    raise
+                self._backoff(attempt)
+                continue
+            except Exception:
+                # Broken responses (truncated chunks, bad encodings, redirect loops) count as failures too,
+                # otherwise a half-open probe ending this way would leave the breaker stuck open
+                breaker.record_failure()
+                raise
+
+            if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+                self._backoff(attempt, retry_after)
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES or response.status_code >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            return response
+
+    @staticmethod
+    def _retryable(method: str, error: Exception) -> bool:
+        """Read timeouts fail fast. Other errors are retried for idempotent methods, but for a POST only when the
+        connection was never made, so a request the server may already be working on is never sent twice."""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        if isinstance(error, requests.exceptions.Timeout):
+            return False
+        if method.upper() in IDEMPOTENT_METHODS:
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str] = None):
+        """Sleeps with full jitter, honouring a numeric Retry-After within the cap."""
+        delay = random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), HTTP_BACKOFF_MAX))
+        time.sleep(delay)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> HttpClient:
+    """Returns the process-wide client so every caller shares one connection pool."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
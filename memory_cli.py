@@ -0,0 +1,241 @@
+"""Bulk maintenance for one user's memory store: export, Chroma rebuild and backfill.
+
+Every command walks SQLite in id order, a chunk at a time, so memory use stays
+flat however large the database is. `reindex` and `backfill` checkpoint the
+last processed id in `maintenance_state` after each batch; rerunning an
+interrupted command picks up where it stopped.
+
+    python memory_cli.py [--user ID] export [--format jsonl|parquet] [--out DIR] [--only conversations|memories]
+    python memory_cli.py [--user ID] reindex [--restart]
+    python memory_cli.py [--user ID] backfill [--restart]
+    python memory_cli.py [--user ID] delete MEMORY_ID [MEMORY_ID ...]
+    python memory_cli.py [--user ID] status
+
+`reindex` drops and refills the user's Chroma collection, so run it while the
+app is stopped; sessions that are open keep a handle to the old collection.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+from config import DEFAULT_USER_ID, MEMORY_EXPORT_CHUNK, MEMORY_REINDEX_BATCH, MEMORY_BACKFILL_BATCH
+from database import MemoryDatabase, memory_hash, memory_vector_id
+from startup import lazy_import
+
+REINDEX_JOB = "reindex"
+BACKFILL_JOB = "backfill"
+
+EXPORTS = {
+    "conversations": ("id, role, content, timestamp, mood",
+                      [("id", "int64"), ("role", "string"), ("content", "string"), ("timestamp", "string"),
+                       ("mood", "string")]),
+    "memories": ("id, memory_type, content, importance, created_at, context, content_hash, vector_id",
+                 [("id", "int64"), ("memory_type", "string"), ("content", "string"), ("importance", "int64"),
+                  ("created_at", "string"), ("context", "string"), ("content_hash", "string"),
+                  ("vector_id", "string")]),
+}
+
+
+def iter_chunks(db, table, columns, chunk_size, after=0):
+    """Yields lists of up to `chunk_size` rows of the user's `table`, in id order, by keyset paging."""
+    while True:
+        rows = db.store.fetchall(f'SELECT {columns} FROM {table} WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?',
+                                 (db.user_id, after, chunk_size))
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][0]
+
+
+class JsonlWriter:
+    def __init__(self, path, fields):
+        self.file = open(path, "w", encoding="utf-8")
+        self.fields = [name for name, _ in fields]
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(self.fields, row)), ensure_ascii=False, default=str) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Writes each chunk as its own row group, so only one chunk is ever held in memory."""
+    def __init__(self, path, fields):
+        self.pa = lazy_import("pyarrow")
+        self.kinds = [kind for _, kind in fields]
+        self.schema = self.pa.schema([(name, getattr(self.pa, kind)()) for name, kind in fields])
+        self.writer = lazy_import("pyarrow.parquet").ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        # Timestamps come back from SQLite as text or datetimes depending on how they were written
+        arrays = [self.pa.array([v if v is None or kind == "int64" else str(v) for v in values], type=field.type)
+                  for field, kind, values in zip(self.schema, self.kinds, zip(*rows))]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+def export(db, out_dir, fmt="jsonl", tables=tuple(EXPORTS), chunk_size=MEMORY_EXPORT_CHUNK):
+    """Streams the user's tables to `out_dir/<table>.<fmt>`. Returns {table: rows written}."""
+    os.makedirs(out_dir, exist_ok=True)
+    counts = {}
+    for table in tables:
+        columns, fields = EXPORTS[table]
+        writer = WRITERS[fmt](os.path.join(out_dir, f"{table}.{fmt}"), fields)
+        counts[table] = 0
+        try:
+            for rows in iter_chunks(db, table, columns, chunk_size):
+                writer.write(rows)
+                counts[table] += len(rows)
+        finally:
+            writer.close()
+    return counts
+
+
+def reindex(db, batch_size=MEMORY_REINDEX_BATCH, restart=False):
+    """Rebuilds the user's Chroma collection from SQLite, one embedding batch per checkpoint.
+
+    Rows without a content hash or vector id (saved before those columns existed)
+    get them here, so afterwards both stores share the same stable ids. Legacy
+    rows repeating an earlier memory word for word are dropped, as `save_memories`
+    would have done. Returns the finished run's summary.
+    """
+    state = db.get_job_state(REINDEX_JOB, {})
+    if restart or not state.get("last_id"):
+        db.index.reset(db.user_id)
+        state = {"last_id": 0, "indexed": 0, "dropped": 0, "started_at": str(datetime.now())}
+        db.set_job_state(REINDEX_JOB, state)
+        db.flush()
+    columns = "id, memory_type, content, importance, created_at, context, content_hash, vector_id"
+    for rows in iter_chunks(db, "memories", columns, batch_size, after=state["last_id"]):
+        batch, seen = [], set()
+        for memory_id, memory_type, content, importance, created_at, context, content_hash, vector_id in rows:
+            content_hash = content_hash or memory_hash(content)
+            duplicate = content_hash in seen or db.store.fetchone(
+                'SELECT 1 FROM memories WHERE user_id = ? AND content_hash = ? AND id < ? LIMIT 1',
+                (db.user_id, content_hash, memory_id)) is not None
+            if duplicate:
+                db.store.write('DELETE FROM memories WHERE id = ? AND user_id = ?', (memory_id, db.user_id))
+                state["dropped"] += 1
+                continue
+            seen.add(content_hash)
+            stable_id = memory_vector_id(db.user_id, content_hash)
+            if vector_id != stable_id:
+                db.store.write('UPDATE memories SET content_hash = ?, vector_id = ? WHERE id = ? AND user_id = ?',
+                               (content_hash, stable_id, memory_id, db.user_id))
+            batch.append((stable_id, content, {"type": memory_type, "importance": importance, "context": context or "",
+                                               "timestamp": str(created_at)}))
+        if batch:
+            ids, documents, metadatas = zip(*batch)
+            embeddings = [list(map(float, e)) for e in db.index.embedding_function(list(documents))]
+            # Upsert keeps a batch that is replayed after a crash from duplicating vectors
+            db.collection.upsert(ids=list(ids), documents=list(documents), embeddings=embeddings,
+                                 metadatas=list(metadatas))
+        state["last_id"] = rows[-1][0]
+        state["indexed"] += len(batch)
+        db.set_job_state(REINDEX_JOB, state)
+        db.flush()
+        print(f"  reindexed through memory {state['last_id']} ({state['indexed']} vectors)", file=sys.stderr)
+    db.memory_generation += 1
+    summary = {"finished_at": str(datetime.now()), "indexed": state["indexed"], "dropped": state["dropped"]}
+    db.set_job_state(REINDEX_JOB, {"last_id": 0, "last_run": summary})
+    db.flush()
+    return summary
+
+
+def backfill(db, memory_processor, batch_size=MEMORY_BACKFILL_BATCH, restart=False):
+    """Extracts memories from stored conversations, the same way live turns do.
+
+    The checkpoint is kept once a run finishes, so the next run only scans turns
+    added since. Memories keep the timestamp of the turn they came from.
+    """
+    state = db.get_job_state(BACKFILL_JOB, {})
+    if restart or "last_id" not in state:
+        state = {"last_id": 0, "saved": 0}
+    scanned = 0
+    contexts = {"user": "User said", "assistant": "Anjali said"}
+    for rows in iter_chunks(db, "conversations", "id, role, content, timestamp", batch_size, after=state["last_id"]):
+        timestamps = {content: timestamp for _, _, content, timestamp in rows}
+        memories = memory_processor.collect_memories([(content, contexts.get(role, "User said"))
+                                                      for _, role, content, _ in rows])
+        for memory in memories:
+            memory["created_at"] = timestamps[memory["content"]]
+        saved = db.save_memories(memories) if memories else []
+        scanned += len(rows)
+        state["last_id"] = rows[-1][0]
+        state["saved"] += len(saved)
+        db.set_job_state(BACKFILL_JOB, state)
+        db.flush()
+        print(f"  scanned through turn {state['last_id']} ({state['saved']} memories saved)", file=sys.stderr)
+    state["last_run"] = {"finished_at": str(datetime.now()), "scanned": scanned}
+    db.set_job_state(BACKFILL_JOB, state)
+    db.flush()
+    return state
+
+
+def status(db):
+    count = lambda sql: db.store.fetchone(sql, (db.user_id,))[0]
+    return {
+        "conversations": count('SELECT COUNT(*) FROM conversations WHERE user_id = ?'),
+        "memories": count('SELECT COUNT(*) FROM memories WHERE user_id = ?'),
+        "memories_without_vector_id": count('SELECT COUNT(*) FROM memories WHERE user_id = ? AND vector_id IS NULL'),
+        "vectors": db.collection.count(),
+        REINDEX_JOB: db.get_job_state(REINDEX_JOB),
+        BACKFILL_JOB: db.get_job_state(BACKFILL_JOB),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--user", default=DEFAULT_USER_ID, help="whose memories to work on")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="stream conversations and memories to files")
+    export_parser.add_argument("--format", choices=sorted(WRITERS), default="jsonl")
+    export_parser.add_argument("--out", default="./exports", help="directory for <table>.<format>")
+    export_parser.add_argument("--only", choices=sorted(EXPORTS), help="export a single table")
+    export_parser.add_argument("--chunk", type=int, default=MEMORY_EXPORT_CHUNK)
+    reindex_parser = commands.add_parser("reindex", help="rebuild the Chroma collection from SQLite")
+    reindex_parser.add_argument("--batch", type=int, default=MEMORY_REINDEX_BATCH)
+    reindex_parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    backfill_parser = commands.add_parser("backfill", help="extract memories from past conversations")
+    backfill_parser.add_argument("--batch", type=int, default=MEMORY_BACKFILL_BATCH)
+    backfill_parser.add_argument("--restart", action="store_true", help="rescan every conversation from the start")
+    delete_parser = commands.add_parser("delete", help="delete memories from SQLite and Chroma")
+    delete_parser.add_argument("memory_ids", type=int, nargs="+")
+    commands.add_parser("status", help="row and vector counts, and job checkpoints")
+    args = parser.parse_args()
+
+    db = MemoryDatabase(args.user)
+    try:
+        if args.command == "export":
+            tables = (args.only,) if args.only else tuple(EXPORTS)
+            for table, rows in export(db, args.out, args.format, tables, args.chunk).items():
+                print(f"Exported {rows} {table} to {os.path.join(args.out, f'{table}.{args.format}')}")
+        elif args.command == "reindex":
+            summary = reindex(db, args.batch, args.restart)
+            print(f"Reindex finished: {summary['indexed']} vectors written, {summary['dropped']} repeated memories dropped")
+        elif args.command == "backfill":
+            from ai_models import MemoryProcessor
+            state = backfill(db, MemoryProcessor(db), args.batch, args.restart)
+            print(f"Backfill finished: {state['last_run']['scanned']} turns scanned, {state['saved']} memories saved in total")
+        elif args.command == "delete":
+            for memory_id in args.memory_ids:
+                db.delete_memory(memory_id)
+            db.flush()
+            print(f"Deleted {len(args.memory_ids)} memories")
+        else:
+            print(json.dumps(status(db), indent=2))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Mapping, Optional, Sequence
+
+from ai_models import CAPTION_FALLBACK, ChatStream
+from config import PIPELINE_BACKGROUND_WORKERS, CAPTION_TIMEOUT
+from prompting import Prompt
+from telemetry import span
+
+
+class KeyedSerialExecutor:
+    """Runs tasks on a shared pool while keeping tasks with the same key in submission order.
+
+    Different keys (sessions) run in parallel; tasks for one key never overlap or
+    reorder, so a session's metric and memory writes land in the order of its turns.
+    """
+    def __init__(self, max_workers: int = PIPELINE_BACKGROUND_WORKERS, name: str = "turn-background"):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.queues: Dict[str, deque] = {}
+        self.lock = threading.Lock()
+
+    def submit(self, key: str, fn: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        with self.lock:
+            pending = self.queues.get(key)
+            if pending is None:
+                pending = self.queues[key] = deque()
+                start = True
+            else:
+                start = False
+            pending.append((fn, args, kwargs, future))
+        if start:
+            self.pool.submit(self._drain, key)
+        return future
+
+    def _drain(self, key: str):
+        while True:
+            with self.lock:
+                pending = self.queues[key]
+                if not pending:
+                    del self.queues[key]
+                    return
+                fn, args, kwargs, future = pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                print(f"Background task for session {key} failed: {e}")
+                future.set_exception(e)
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+class TurnPipeline:
+    """One conversational turn as stages:
+
+    1. prepare  - captioning and memory retrieval run concurrently, then the prompt is built
+    2. respond  - the LLM reply streams straight to the caller
+    3. finish   - sentiment metrics, memory extraction, embedding and persistence run in
+                  the background, ordered per session
+    The pipeline knows nothing about Streamlit, so it can also be driven headlessly.
+    """
+    def __init__(self, db, memory_processor, chat_model, prompt_builder, caption_service,
+                 stage_executor: ThreadPoolExecutor, background: KeyedSerialExecutor):
+        self.db = db
+        self.memory_processor = memory_processor
+        self.chat_model = chat_model
+        self.prompt_builder = prompt_builder
+        self.caption_service = caption_service
+        self.stage_executor = stage_executor
+        self.background = background
+
+    def prepare(self, prompt: str, history: Sequence[Mapping], mood: str,
+                image_bytes: Optional[bytes] = None) -> Prompt:
+        caption_future = self.caption_service.submit(image_bytes) if image_bytes else None
+        context_future = self.stage_executor.submit(self._retrieve, prompt)
+        try:
+            context = context_future.result()
+        except Exception as e:
+            print(f"Memory retrieval failed: {e}")
+            context = ""
+
+        image_context = ""
+        if caption_future:
+            try:
+                # Only the part not already hidden behind retrieval
+                with span("caption.wait"):
+                    caption = caption_future.result(timeout=CAPTION_TIMEOUT)
+            except Exception:
+                caption = CAPTION_FALLBACK
+            image_context = f"\nThe user has shared an image with me. I see: {caption}"
+
+        with span("prompt.build"):
+            return self.prompt_builder.build(history=history, user_message=prompt, mood=mood,
+                                             memory_context=context, image_context=image_context)
+
+    def _retrieve(self, prompt: str) -> str:
+        with span("retrieval"):
+            return self.memory_processor.get_relevant_context(prompt)
+
+    def respond(self, prompt: Prompt, mood: str) -> ChatStream:
+        return self.chat_model.stream_response(prompt.messages, mood=mood)
+
+    def finish(self, session_key: str, prompt: str, response: str, sentiment: str) -> Future:
+        """Queues the post-response work for this session and returns its future."""
+        return self.background.submit(session_key, self._persist_turn, prompt, response, sentiment)
+
+    def _persist_turn(self, prompt: str, response: str, sentiment: str):
+        # Update relationship based on sentiment
+        with span("sentiment.update"):
+            self.db.update_interaction_metrics(sentiment)
+        # Process and save new memories from both user prompt and AI response, deduplicated in one batch
+        with span("memory.extract"):
+            memories = self.memory_processor.collect_memories([(prompt, "User said"), (response, "Anjali said")])
+        with span("memory.save"):
+            return self.db.save_memories(memories)
@@ -0,0 +1,197 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from caching import LRUCache
+from config import (ANJALI_PERSONALITY, MOOD_PROMPTS, PROMPT_TOKEN_BUDGET, PROMPT_SUMMARY_TOKENS,
+                    PROMPT_SUMMARY_SOURCE_MESSAGES, PROMPT_TOKENIZER)
+from startup import lazy_import
+
+MESSAGE_OVERHEAD_TOKENS = 4 # Role and separators the chat template adds around each message
+_WORDPIECE = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """Counts tokens with a word-piece estimate until the chat model's own tokenizer is loaded.
+
+    `load_tokenizer` swaps the real tokenizer in. It only reads the local Hugging
+    Face cache and is meant for the warm-up thread, so nothing on the request path
+    imports transformers or touches the network. Fill the cache once with
+    `huggingface-cli download <PROMPT_TOKENIZER> tokenizer.json tokenizer_config.json`.
+    """
+    def __init__(self, model_name: str = PROMPT_TOKENIZER):
+        self.model_name = model_name
+        self.encoding = None
+        self.cache = LRUCache(2048)
+
+    def load_tokenizer(self) -> bool:
+        """Loads the tokenizer from the local cache; returns False (keeping the estimate) if it isn't there."""
+        try:
+            auto_tokenizer = lazy_import("transformers").AutoTokenizer
+            self.encoding = auto_tokenizer.from_pretrained(self.model_name, local_files_only=True)
+            return True
+        except Exception as e:
+            print(f"Tokenizer {self.model_name} not in the local cache, estimating prompt tokens: {e}")
+            return False
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        encoding = self.encoding
+        # Keyed by which counter produced the value, so estimates don't outlive the tokenizer's arrival
+        key = (encoding is not None, text)
+        cached = self.cache.get(key)
+        if cached is None:
+            if encoding is not None:
+                cached = len(encoding.encode(text, add_special_tokens=False))
+            else:
+                # Subword tokenizers split roughly one word in three into two pieces
+                cached = (len(_WORDPIECE.findall(text)) * 4 + 2) // 3
+            self.cache.put(key, cached)
+        return cached
+
+    def message(self, content: str) -> int:
+        return self.count(content) + MESSAGE_OVERHEAD_TOKENS
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cuts text down to roughly `max_tokens`, marking the cut with an ellipsis."""
+        if self.count(text) <= max_tokens:
+            return text
+        if max_tokens <= 0:
+            return ""
+        encoding = self.encoding
+        if encoding is not None:
+            ids = encoding.encode(text, add_special_tokens=False)
+            return encoding.decode(ids[:max_tokens - 1]) + "…"
+        pieces = list(_WORDPIECE.finditer(text))
+        keep = max(1, (max_tokens - 1) * 3 // 4)
+        return text[:pieces[min(keep, len(pieces)) - 1].end()] + "…"
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+def get_token_counter() -> TokenCounter:
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = TokenCounter()
+    return _counter
+
+
+@lru_cache(maxsize=None)
+def system_prompt(mood: str) -> str:
+    """The personality plus mood instructions, built once per mood."""
+    system_message = ANJALI_PERSONALITY
+    if mood in MOOD_PROMPTS:
+        system_message += f"\n\n{MOOD_PROMPTS[mood]}"
+    return system_message
+
+
+@lru_cache(maxsize=None)
+def system_prompt_tokens(mood: str) -> int:
+    return get_token_counter().message(system_prompt(mood))
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """An assembled, read-only prompt. `messages` excludes the system prefix ChatModel adds."""
+    messages: Tuple[Mapping[str, str], ...]
+    token_count: int
+    breakdown: Mapping[str, int] = field(default_factory=dict)
+
+    def as_list(self) -> List[Dict[str, str]]:
+        """Fresh message dicts for the request payload."""
+        return [dict(message) for message in self.messages]
+
+
+def _message(role: str, content: str) -> Mapping[str, str]:
+    return MappingProxyType({"role": role, "content": content})
+
+
+def _compact(text: str, limit: int = 160) -> str:
+    """First sentence of a message, capped, for the rolling summary."""
+    first = re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0]
+    return first if len(first) <= limit else first[:limit - 1].rstrip() + "…"
+
+
+class PromptBuilder:
+    """Fits the turn into `PROMPT_TOKEN_BUDGET` tokens by priority.
+
+    Always kept: the per-mood system prefix and the current user message with its
+    image context (truncated only if it alone exceeds the budget). Then, while
+    tokens remain: retrieved memories, recent history newest first, and finally a
+    rolling summary of the older turns that no longer fit verbatim.
+    """
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET):
+        self.budget = budget
+        self.counter = get_token_counter()
+        self.lock = threading.Lock()
+        self.stats = {"prompts": 0, "total_tokens": 0, "max_tokens": 0, "last_tokens": 0}
+
+    def build(self, history: Sequence[Mapping[str, str]], user_message: str, mood: str = "friendly",
+              memory_context: str = "", image_context: str = "") -> Prompt:
+        counter = self.counter
+        breakdown = {"system": system_prompt_tokens(mood)}
+        remaining = self.budget - breakdown["system"]
+
+        user_text = (user_message or "") + image_context
+        if counter.message(user_text) > remaining:
+            # Keep the image description intact and shorten the pasted text instead
+            room = remaining - MESSAGE_OVERHEAD_TOKENS - counter.count(image_context)
+            user_text = counter.truncate(user_message or "", room) + image_context
+        breakdown["user"] = counter.message(user_text)
+        remaining -= breakdown["user"]
+
+        memory_message: Optional[Mapping[str, str]] = None
+        if memory_context:
+            lines = memory_context.splitlines()
+            while len(lines) > 1 and counter.message("\n".join(lines)) > remaining:
+                lines.pop()
+            if len(lines) > 1:
+                memory_message = _message("system", "\n".join(lines))
+                breakdown["memories"] = counter.message(memory_message["content"])
+                remaining -= breakdown["memories"]
+
+        recent: List[Mapping[str, str]] = []
+        breakdown["history"] = 0
+        for message in reversed(history):
+            cost = counter.message(message["content"])
+            # Leave room for the summary so older context isn't lost completely
+            if cost > remaining - PROMPT_SUMMARY_TOKENS:
+                break
+            recent.append(_message(message["role"], message["content"]))
+            breakdown["history"] += cost
+            remaining -= cost
+        recent.reverse()
+
+        summary_message = None
+        older = history[:len(history) - len(recent)]
+        if older and remaining > MESSAGE_OVERHEAD_TOKENS:
+            summary = self._summarize(older[-PROMPT_SUMMARY_SOURCE_MESSAGES:])
+            summary = counter.truncate(summary, min(PROMPT_SUMMARY_TOKENS, remaining) - MESSAGE_OVERHEAD_TOKENS)
+            if summary:
+                summary_message = _message("system", summary)
+                breakdown["summary"] = counter.message(summary)
+
+        messages = tuple(m for m in (summary_message, memory_message) if m) + tuple(recent) + (_message("user", user_text),)
+        prompt = Prompt(messages=messages, token_count=sum(breakdown.values()), breakdown=MappingProxyType(breakdown))
+        self._record(prompt.token_count)
+        return prompt
+
+    @staticmethod
+    def _summarize(messages: Sequence[Mapping[str, str]]) -> str:
+        lines = [f"{'User' if m['role'] == 'user' else 'Anjali'}: {_compact(m['content'])}" for m in messages]
+        # Newest lines matter most, so they come first and survive truncation
+        return "Earlier in this conversation:\n" + "\n".join(reversed(lines))
+
+    def _record(self, tokens: int):
+        with self.lock:
+            self.stats["prompts"] += 1
+            self.stats["total_tokens"] += tokens
+            self.stats["max_tokens"] = max(self.stats["max_tokens"], tokens)
+            self.stats["last_tokens"] = tokens
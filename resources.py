@@ -0,0 +1,88 @@
+import threading
+import weakref
+from typing import Any, Callable, Dict, List
+
+
+class ResourceRegistry:
+    """Process-wide home for heavy objects (BLIP weights, Chroma client, embeddings).
+
+    Every instance is created once, shared by all sessions and reference counted;
+    when the last holder releases it the registry drops it and calls `close()`
+    if the object has one.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resources: Dict[str, Any] = {}
+        self.refcounts: Dict[str, int] = {}
+        self.build_locks: Dict[str, threading.Lock] = {}
+
+    def acquire(self, name: str, factory: Callable[[], Any]) -> Any:
+        with self.lock:
+            build_lock = self.build_locks.setdefault(name, threading.Lock())
+        # Build outside the registry lock so loading BLIP doesn't stall every other resource
+        with build_lock:
+            with self.lock:
+                if name in self.resources:
+                    self.refcounts[name] += 1
+                    return self.resources[name]
+            instance = factory()
+            with self.lock:
+                self.resources[name] = instance
+                self.refcounts[name] = 1
+            return instance
+
+    def release(self, name: str):
+        with self.lock:
+            if name not in self.refcounts:
+                return
+            self.refcounts[name] -= 1
+            if self.refcounts[name] > 0:
+                return
+            del self.refcounts[name]
+            instance = self.resources.pop(name)
+        close = getattr(instance, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"Error closing shared resource '{name}': {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.refcounts)
+
+
+_registry = ResourceRegistry()
+
+def get_registry() -> ResourceRegistry:
+    return _registry
+
+
+def _release_all(registry: ResourceRegistry, names: List[str]):
+    # Newest first: later resources (consolidator, background tasks) may still write through earlier ones (db)
+    for name in reversed(names):
+        registry.release(name)
+    names.clear()
+
+
+class SessionResources:
+    """A session's handle on shared resources.
+
+    Holds one reference per resource name and gives them all back when the
+    handle is closed or garbage collected along with the session state.
+    """
+    def __init__(self, registry: ResourceRegistry = None):
+        self.registry = registry or get_registry()
+        self.names: List[str] = []
+        self.instances: Dict[str, Any] = {}
+        self._finalizer = weakref.finalize(self, _release_all, self.registry, self.names)
+
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        if name not in self.instances:
+            self.instances[name] = self.registry.acquire(name, factory)
+            self.names.append(name)
+        return self.instances[name]
+
+    def close(self):
+        self.instances.clear()
+        self._finalizer()
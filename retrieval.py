@@ -0,0 +1,121 @@
+import math
+import re
+from datetime import datetime
+from typing import Dict, List
+
+from caching import LRUCache
+from config import (RETRIEVAL_CACHE_SIZE, RETRIEVAL_WEIGHTS, RETRIEVAL_RECENCY_HALF_LIFE_DAYS,
+                    RETRIEVAL_MAX_DISTANCE, RETRIEVAL_LEXICAL_CONFIDENCE)
+
+# Words that carry no retrievable meaning on their own; a query made only of these
+# (greetings, filler) skips retrieval entirely.
+STOPWORDS = {
+    "a", "about", "all", "am", "an", "and", "any", "are", "as", "at", "be", "but", "by", "can", "could", "did",
+    "do", "does", "for", "from", "get", "good", "got", "had", "has", "have", "he", "hello", "her", "hey", "hi",
+    "him", "his", "how", "i", "if", "im", "in", "is", "it", "its", "just", "let", "lol", "me", "morning", "my",
+    "night", "no", "not", "now", "of", "ok", "okay", "on", "or", "our", "she", "so", "thank", "thanks", "that",
+    "the", "their", "them", "then", "there", "they", "this", "to", "too", "up", "us", "was", "we", "were",
+    "what", "when", "where", "which", "who", "why", "will", "with", "would", "yeah", "yes", "you", "your",
+}
+# MemoryProcessor's extraction triggers. Nearly every stored memory contains one, so a full-text match
+# on them singles nothing out: they never make a lexical hit confident, but the vector search still uses them.
+TRIGGER_WORDS = {
+    "name", "favorite", "favourite", "love", "loves", "loved", "like", "likes", "liked", "prefer", "prefers",
+    "birthday", "anniversary", "tomorrow", "yesterday", "meeting", "happy", "sad", "excited", "worried", "stressed",
+}
+
+
+def query_terms(query: str) -> List[str]:
+    terms = []
+    for token in re.findall(r"[a-z0-9]+", query.lower()):
+        if len(token) > 1 and token not in STOPWORDS and token not in terms:
+            terms.append(token)
+    return terms
+
+
+def term_coverage(terms: List[str], content: str) -> float:
+    """Share of query terms that start a word of `content`, the way the FTS prefix query matches them."""
+    words = re.findall(r"[a-z0-9]+", content.lower())
+    return sum(any(word.startswith(term) for word in words) for term in terms) / len(terms)
+
+
+class RetrievalEngine:
+    """Hybrid memory retrieval: FTS5 prefilter first, Chroma vector search unless the lexical hits are confident.
+
+    Lexical hits are confident when they contain at least `RETRIEVAL_LEXICAL_CONFIDENCE`
+    of the query terms that aren't `TRIGGER_WORDS`. The vector search is skipped
+    only when there are at least `limit` such hits and they don't fill the whole
+    prefilter window; a window full of equally good matches means the query was
+    too broad to single anything out. Queries made only of trigger words ("what's
+    my name?") go straight to the vector search.
+
+    Query embeddings are cached by normalized query text; result lists are cached
+    too and dropped whenever `MemoryDatabase.memory_generation` changes. Candidates
+    are re-ranked by relevance, importance and recency.
+    """
+    def __init__(self, db, cache_size: int = RETRIEVAL_CACHE_SIZE):
+        self.db = db
+        self.embeddings = LRUCache(cache_size)
+        self.results = LRUCache(cache_size)
+        self.generation = db.memory_generation
+
+    def search(self, query: str, limit: int = 3) -> List[Dict]:
+        terms = query_terms(query)
+        if not terms:
+            return []
+        if self.generation != self.db.memory_generation:
+            self.results.clear()
+            self.generation = self.db.memory_generation
+        key = (" ".join(query.lower().split()), limit)
+        cached = self.results.get(key)
+        if cached is not None:
+            return cached
+
+        candidates = {}
+        window = limit * 3
+        confident = 0
+        distinctive = [term for term in terms if term not in TRIGGER_WORDS]
+        lexical = self.db.search_memories_lexical(terms, window) if distinctive else []
+        for memory_id, content, importance, created_at, bm25 in lexical:
+            # FTS5's bm25 is negative, lower is better; squash it into 0..1 and discount partial matches
+            score = -bm25
+            confident += term_coverage(distinctive, content) >= RETRIEVAL_LEXICAL_CONFIDENCE
+            candidates[content] = {"content": content, "importance": importance, "timestamp": created_at,
+                                   "relevance": term_coverage(terms, content) * score / (score + 1)}
+        if not limit <= confident < window:
+            self._add_vector_candidates(key[0], limit, candidates)
+
+        ranked = sorted(candidates.values(), key=self._score, reverse=True)[:limit]
+        self.results.put(key, ranked)
+        return ranked
+
+    def _add_vector_candidates(self, query: str, limit: int, candidates: Dict[str, Dict]):
+        collection = self.db.collection
+        if collection.count() == 0:
+            return
+        embedding = self.embeddings.get(query)
+        if embedding is None:
+            embedding = [float(x) for x in self.db.index.embedding_function([query])[0]]
+            self.embeddings.put(query, embedding)
+        results = collection.query(query_embeddings=[embedding], n_results=min(limit * 2, collection.count()),
+                                   include=["documents", "metadatas", "distances"])
+        for content, metadata, distance in zip(results["documents"][0], results["metadatas"][0], results["distances"][0]):
+            if distance > RETRIEVAL_MAX_DISTANCE:
+                continue
+            relevance = 1 - distance
+            if content in candidates:
+                candidates[content]["relevance"] = max(candidates[content]["relevance"], relevance)
+                continue
+            candidates[content] = {"content": content, "importance": (metadata or {}).get("importance", 5),
+                                   "timestamp": (metadata or {}).get("timestamp"), "relevance": relevance}
+
+    @staticmethod
+    def _score(candidate: Dict) -> float:
+        try:
+            age_days = (datetime.now() - datetime.fromisoformat(str(candidate["timestamp"]))).total_seconds() / 86400
+        except (TypeError, ValueError):
+            age_days = RETRIEVAL_RECENCY_HALF_LIFE_DAYS
+        recency = math.exp(-math.log(2) * max(age_days, 0) / RETRIEVAL_RECENCY_HALF_LIFE_DAYS)
+        return (RETRIEVAL_WEIGHTS["relevance"] * candidate["relevance"]
+                + RETRIEVAL_WEIGHTS["importance"] * (candidate["importance"] or 0) / 10
+                + RETRIEVAL_WEIGHTS["recency"] * recency)
@@ -0,0 +1,267 @@
+import io
+import json
+import threading
+import wave
+from dataclasses import dataclass
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from config import (STT_BACKEND, STT_HTTP_URL, STT_LANGUAGE, STT_SAMPLE_RATE, STT_MAX_SECONDS, STT_VAD_FRAME_MS,
+                    STT_VAD_THRESHOLD_DB, STT_VAD_FLOOR_DB, STT_VAD_PADDING_MS,
+                    STT_VOSK_MODEL_PATH, STT_WHISPER_MODEL)
+from http_client import get_client
+from startup import lazy_import
+
+
+class SpeechNotUnderstood(Exception):
+    """The recording held no recognizable speech."""
+
+
+class SpeechServiceError(Exception):
+    """The recognizer backend failed or could not be reached."""
+
+
+@dataclass(frozen=True)
+class PreparedAudio:
+    """16-bit mono PCM ready for a recognizer, plus what preprocessing did to it."""
+    pcm: bytes
+    sample_rate: int
+    duration: float
+    original_duration: float
+
+    @property
+    def samples(self) -> np.ndarray:
+        return np.frombuffer(self.pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def decode(audio_bytes: bytes) -> Tuple[np.ndarray, int]:
+    """Decodes a recording to mono float32 samples in [-1, 1] without touching disk.
+
+    WAV (what the browser recorder sends) is parsed with the stdlib. Other formats
+    go through PyAV's in-process decoder when installed, and only fall back to
+    pydub, which spawns an ffmpeg subprocess per clip, as a last resort.
+    """
+    if audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE":
+        try:
+            return _decode_wav(audio_bytes)
+        except (wave.Error, ValueError):
+            pass # Compressed or float WAV; let a full decoder handle it
+    try:
+        av = lazy_import("av")
+    except ImportError:
+        return _decode_pydub(audio_bytes)
+    return _decode_av(av, audio_bytes)
+
+
+def _decode_wav(audio_bytes: bytes) -> Tuple[np.ndarray, int]:
+    with wave.open(io.BytesIO(audio_bytes)) as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        # Little-endian 24-bit: sign-extend the high byte
+        samples = ((raw[:, 0] | raw[:, 1] << 8 | raw[:, 2] << 16) << 8 >> 8).astype(np.float32) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+    return _downmix(samples, channels), rate
+
+
+def _decode_av(av, audio_bytes: bytes) -> Tuple[np.ndarray, int]:
+    with av.open(io.BytesIO(audio_bytes)) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=stream.rate)
+        chunks = [resampled.to_ndarray().reshape(-1)
+                  for frame in container.decode(stream) for resampled in resampler.resample(frame)]
+        rate = stream.rate
+    return (np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)), rate
+
+
+def _decode_pydub(audio_bytes: bytes) -> Tuple[np.ndarray, int]:
+    segment = lazy_import("pydub").AudioSegment.from_file(io.BytesIO(audio_bytes))
+    scale = float(1 << (8 * segment.sample_width - 1))
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float32) / scale
+    return _downmix(samples, segment.channels), segment.frame_rate
+
+
+def _downmix(samples: np.ndarray, channels: int) -> np.ndarray:
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+    return samples.astype(np.float32, copy=False)
+
+
+def resample(samples: np.ndarray, rate: int, target: int = STT_SAMPLE_RATE) -> np.ndarray:
+    """Linear-interpolation resampling, with a box filter first when downsampling to limit aliasing."""
+    if rate == target or not len(samples):
+        return samples
+    if rate > target:
+        width = int(round(rate / target))
+        if width > 1:
+            samples = np.convolve(samples, np.ones(width, dtype=np.float32) / width, mode="same")
+    count = int(round(len(samples) * target / rate))
+    positions = np.arange(count, dtype=np.float64) * (rate / target)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def trim_silence(samples: np.ndarray, rate: int, frame_ms: int = STT_VAD_FRAME_MS,
+                 threshold_db: float = STT_VAD_THRESHOLD_DB, padding_ms: int = STT_VAD_PADDING_MS) -> np.ndarray:
+    """Energy-based VAD: drops leading and trailing frames quieter than the threshold.
+
+    The threshold is relative to the loudest frame, so it adapts to the mic gain,
+    but never below `STT_VAD_FLOOR_DB` so pure background noise is dropped. A
+    little padding is kept on both sides so word onsets are not clipped.
+    Returns an empty array when no frame is loud enough to be speech.
+    """
+    frame = max(1, rate * frame_ms // 1000)
+    count = len(samples) // frame
+    if not count:
+        return samples
+    frames = samples[:count * frame].reshape(count, frame)
+    energy_db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    voiced = np.flatnonzero(energy_db > max(energy_db.max() + threshold_db, STT_VAD_FLOOR_DB))
+    if not len(voiced):
+        return samples[:0]
+    pad = padding_ms * rate // 1000
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def preprocess(audio_bytes: bytes, max_seconds: float = STT_MAX_SECONDS) -> PreparedAudio:
+    """Decode, downmix, resample to `STT_SAMPLE_RATE`, trim silence and cap the duration."""
+    samples, rate = decode(audio_bytes)
+    original_duration = len(samples) / rate if rate else 0.0
+    samples = trim_silence(resample(samples, rate), STT_SAMPLE_RATE)
+    samples = samples[:int(max_seconds * STT_SAMPLE_RATE)]
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    return PreparedAudio(pcm=pcm, sample_rate=STT_SAMPLE_RATE, duration=len(samples) / STT_SAMPLE_RATE,
+                         original_duration=original_duration)
+
+
+class GoogleRecognizer:
+    """The free Google Web Speech API through SpeechRecognition (needs network)."""
+    def __init__(self, language: str = STT_LANGUAGE):
+        self.sr = lazy_import("speech_recognition")
+        self.recognizer = self.sr.Recognizer()
+        self.language = language
+
+    def transcribe(self, audio: PreparedAudio) -> str:
+        data = self.sr.AudioData(audio.pcm, audio.sample_rate, 2)
+        try:
+            return self.recognizer.recognize_google(data, language=self.language)
+        except self.sr.UnknownValueError as e:
+            raise SpeechNotUnderstood() from e
+        except self.sr.RequestError as e:
+            raise SpeechServiceError(str(e)) from e
+
+
+class VoskRecognizer:
+    """Offline recognition with a local Vosk model (pip install vosk, then download a model)."""
+    def __init__(self, model_path: str = STT_VOSK_MODEL_PATH):
+        self.vosk = lazy_import("vosk")
+        self.model = self.vosk.Model(model_path)
+
+    def transcribe(self, audio: PreparedAudio) -> str:
+        recognizer = self.vosk.KaldiRecognizer(self.model, audio.sample_rate)
+        recognizer.AcceptWaveform(audio.pcm)
+        text = json.loads(recognizer.FinalResult()).get("text", "")
+        if not text:
+            raise SpeechNotUnderstood()
+        return text
+
+
+class WhisperRecognizer:
+    """Offline recognition with faster-whisper (pip install faster-whisper)."""
+    def __init__(self, model_name: str = STT_WHISPER_MODEL, language: str = STT_LANGUAGE):
+        self.model = lazy_import("faster_whisper").WhisperModel(model_name, device="cpu", compute_type="int8")
+        self.language = language.split("-")[0]
+        self.lock = threading.Lock()
+
+    def transcribe(self, audio: PreparedAudio) -> str:
+        with self.lock:
+            segments, _ = self.model.transcribe(audio.samples, language=self.language)
+            text = " ".join(segment.text.strip() for segment in segments).strip()
+        if not text:
+            raise SpeechNotUnderstood()
+        return text
+
+
+class HttpRecognizer:
+    """Any recognition service that takes a WAV body and answers with {"text": ...}."""
+    def __init__(self, url: str = STT_HTTP_URL, language: str = STT_LANGUAGE):
+        if not url:
+            raise ValueError("STT_HTTP_URL must be set for the http STT backend")
+        self.url = url
+        self.language = language
+
+    def transcribe(self, audio: PreparedAudio) -> str:
+        body = io.BytesIO()
+        with wave.open(body, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(audio.sample_rate)
+            wav.writeframes(audio.pcm)
+        try:
+            response = get_client().post("stt", self.url, data=body.getvalue(), params={"language": self.language},
+                                         headers={"Content-Type": "audio/wav"})
+            response.raise_for_status()
+            text = response.json().get("text", "")
+        except Exception as e:
+            raise SpeechServiceError(str(e)) from e
+        if not text:
+            raise SpeechNotUnderstood()
+        return text
+
+
+RECOGNIZERS: Dict[str, Callable[[], object]] = {
+    "google": GoogleRecognizer,
+    "vosk": VoskRecognizer,
+    "whisper": WhisperRecognizer,
+    "http": HttpRecognizer,
+}
+
+
+class SpeechToText:
+    """Preprocesses recordings in-process and hands them to the configured recognizer.
+
+    The recognizer (and any local model it loads) is created once and reused, so
+    offline engines stay warm between clips.
+    """
+    def __init__(self, backend: str = STT_BACKEND):
+        if backend not in RECOGNIZERS:
+            raise ValueError(f"Unknown STT backend {backend!r}; choose one of {sorted(RECOGNIZERS)}")
+        self.backend = backend
+        self.recognizer = None
+        self.lock = threading.Lock()
+
+    def load_recognizer(self):
+        if self.recognizer is None:
+            with self.lock:
+                if self.recognizer is None:
+                    self.recognizer = RECOGNIZERS[self.backend]()
+        return self.recognizer
+
+    def transcribe(self, audio_bytes: bytes) -> str:
+        audio = preprocess(audio_bytes)
+        if not audio.pcm:
+            # Nothing above the VAD threshold; no point sending silence to the recognizer
+            raise SpeechNotUnderstood()
+        return self.load_recognizer().transcribe(audio)
+
+
+_speech_to_text = None
+_speech_lock = threading.Lock()
+
+def get_speech_to_text() -> SpeechToText:
+    global _speech_to_text
+    if _speech_to_text is None:
+        with _speech_lock:
+            if _speech_to_text is None:
+                _speech_to_text = SpeechToText()
+    return _speech_to_text
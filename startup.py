@@ -0,0 +1,81 @@
+import importlib
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable
+
+from config import WARMUP_MODULES
+
+PROCESS_STARTED = time.perf_counter()
+
+_import_times: Dict[str, float] = {}
+_lock = threading.Lock()
+_warmup_thread = None
+
+
+def lazy_import(name: str):
+    """Imports a heavy module on first use and records how long that first import took."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        _import_times.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def import_report() -> Dict[str, float]:
+    """Seconds spent on each lazily imported module so far in this process."""
+    with _lock:
+        return dict(_import_times)
+
+
+def start_warmup(modules: Iterable[str] = WARMUP_MODULES, tasks: Iterable[Callable[[], None]] = ()):
+    """Imports the heavy modules on a daemon thread so the first image or voice turn doesn't pay for them.
+
+    `tasks` run on the same thread once the imports are done, for loading that needs them.
+    """
+    global _warmup_thread
+    with _lock:
+        if _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(target=_warm_up, args=(list(modules), list(tasks)), name="warmup", daemon=True)
+    _warmup_thread.start()
+
+
+def _warm_up(modules, tasks=()):
+    for name in modules:
+        try:
+            lazy_import(name)
+        except Exception as e:
+            print(f"Warm-up import of {name} failed: {e}")
+    for task in tasks:
+        try:
+            task()
+        except Exception as e:
+            print(f"Warm-up task {getattr(task, '__qualname__', task)} failed: {e}")
+
+
+def measure_import_costs(modules: Iterable[str]) -> Dict[str, float]:
+    """Cold import time of each module, measured in a fresh interpreter with `-X importtime`."""
+    costs = {}
+    for name in modules:
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {name}"],
+                                capture_output=True, text=True)
+        # Lines look like "import time:  self [us] | cumulative | imported package"
+        pattern = re.compile(rf"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*{re.escape(name)}\s*$")
+        cumulative = [int(m.group(1)) for m in map(pattern.match, result.stderr.splitlines()) if m]
+        costs[name] = cumulative[-1] / 1e6 if cumulative else float("nan")
+    return costs
+
+
+if __name__ == "__main__":
+    modules = sys.argv[1:] or ["streamlit", "app"] + list(WARMUP_MODULES)
+    costs = measure_import_costs(modules)
+    width = max(len(name) for name in costs)
+    print(f"{'module':<{width}}  cold import (s)")
+    for name, seconds in sorted(costs.items(), key=lambda item: -item[1] if item[1] == item[1] else float("inf")):
+        print(f"{name:<{width}}  {seconds:8.3f}")
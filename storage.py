@@ -0,0 +1,155 @@
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, List, Tuple
+
+from config import (SQLITE_READ_POOL_SIZE, SQLITE_WRITE_BATCH_SIZE, SQLITE_WRITE_BATCH_WAIT_MS,
+                    SQLITE_CACHE_SIZE_KB, SQLITE_BUSY_TIMEOUT_MS)
+from telemetry import span
+
+_STOP = object()
+
+
+class _Flush:
+    """Queue marker whose event is set once every write queued before it is committed."""
+    def __init__(self):
+        self.event = threading.Event()
+
+
+class SQLiteStore:
+    """WAL-mode SQLite with pooled read connections and a write-behind queue.
+
+    Writes are queued and applied by one writer thread that commits them in
+    groups of up to `SQLITE_WRITE_BATCH_SIZE` statements (or every
+    `SQLITE_WRITE_BATCH_WAIT_MS`), so a turn no longer pays one fsync per
+    statement. Reads see committed data only; call `flush()` when a read must
+    observe writes queued just before it.
+    """
+    def __init__(self, path: str, pool_size: int = SQLITE_READ_POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self.pool = queue.LifoQueue()
+        self.opened = 0
+        self.pool_lock = threading.Lock()
+        self.writes = queue.Queue()
+        self.closed = False
+        self.writer = threading.Thread(target=self._write_loop, name="sqlite-writer", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def connect(self) -> sqlite3.Connection:
+        # Connections move between threads through the pool but are only ever used by one at a time
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode NORMAL only syncs at checkpoints and is still safe against corruption
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Borrows a read connection from the pool."""
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            with self.pool_lock:
+                can_open = self.opened < self.pool_size
+                if can_open:
+                    self.opened += 1
+            conn = self.connect() if can_open else self.pool.get()
+        try:
+            yield conn
+        finally:
+            self.pool.put(conn)
+
+    def fetchone(self, sql: str, params: Tuple = ()):
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def fetchall(self, sql: str, params: Tuple = ()) -> List[Tuple]:
+        with self.reader() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def execute_now(self, statements: Iterable[Tuple[str, Tuple]]):
+        """Runs statements synchronously in one transaction (schema setup and migrations)."""
+        self.flush()
+        with self.reader() as conn:
+            with conn:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+
+    def write(self, sql: str, params: Tuple = ()):
+        """Queues a write for the next group commit."""
+        if self.closed:
+            raise RuntimeError("SQLiteStore is closed")
+        self.writes.put((sql, params))
+
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until every write queued so far has been committed."""
+        if self.closed:
+            return True
+        marker = _Flush()
+        self.writes.put(marker)
+        return marker.event.wait(timeout)
+
+    def pending_writes(self) -> int:
+        return self.writes.qsize()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+        self.writes.put(_STOP)
+        self.writer.join(timeout=5)
+        while not self.pool.empty():
+            self.pool.get_nowait().close()
+
+    def _write_loop(self):
+        conn = self.connect()
+        while True:
+            item = self.writes.get()
+            batch = [item]
+            deadline = time.monotonic() + SQLITE_WRITE_BATCH_WAIT_MS / 1000
+            while item is not _STOP and len(batch) < SQLITE_WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self.writes.get(timeout=remaining) if remaining > 0 else self.writes.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                if isinstance(item, _Flush):
+                    # Someone is waiting on this commit, don't hold it for the rest of the window
+                    break
+
+            statements = [entry for entry in batch if isinstance(entry, tuple)]
+            if statements:
+                with span("db.commit", statements=len(statements)):
+                    self._commit(conn, statements)
+            for entry in batch:
+                if isinstance(entry, _Flush):
+                    entry.event.set()
+            if batch[-1] is _STOP:
+                conn.close()
+                return
+
+    @staticmethod
+    def _commit(conn: sqlite3.Connection, statements: List[Tuple[str, Tuple]]):
+        try:
+            with conn:
+                for sql, params in statements:
+                    conn.execute(sql, params)
+        except sqlite3.Error as e:
+            # Replay one by one so a single bad statement doesn't lose the rest of the group
+            print(f"Group commit failed ({e}), retrying {len(statements)} writes individually")
+            for sql, params in statements:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                except sqlite3.Error as e:
+                    print(f"Dropped write after error: {e}")
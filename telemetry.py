@@ -0,0 +1,204 @@
+import bisect
+import functools
+import json
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+
+from config import TELEMETRY_ENABLED, TELEMETRY_JSON_LOGS, TELEMETRY_BUCKETS, TELEMETRY_SAMPLE_WINDOW, METRICS_PORT
+
+logger = logging.getLogger("anjali.telemetry")
+
+
+class Histogram:
+    """Cumulative Prometheus-style buckets plus a window of recent samples for percentiles."""
+    def __init__(self, buckets: Sequence[float] = TELEMETRY_BUCKETS, window: int = TELEMETRY_SAMPLE_WINDOW):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def observe(self, seconds: float, error: bool = False):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.count += 1
+            self.sum += seconds
+            self.errors += error
+            self.recent.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        with self.lock:
+            ordered = sorted(self.recent)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def summary(self) -> Dict[str, float]:
+        with self.lock:
+            count, total, errors = self.count, self.sum, self.errors
+        return {"count": count, "errors": errors, "mean": total / count if count else 0.0,
+                "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99)}
+
+
+class _Span:
+    __slots__ = ("telemetry", "name", "attrs", "start")
+
+    def __init__(self, telemetry, name: str, attrs: Dict):
+        self.telemetry = telemetry
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.observe(self.name, time.perf_counter() - self.start, error=exc_type is not None, **self.attrs)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Telemetry:
+    """In-process latency histograms keyed by stage name.
+
+    `span(name)` times a block; `observe(name, seconds)` records a duration measured
+    elsewhere (e.g. time to first token). When disabled both return immediately and
+    `span` hands back one shared no-op context manager, so instrumented code pays
+    a single attribute check. Every observation can also be logged as one JSON line.
+    """
+    def __init__(self, enabled: bool = TELEMETRY_ENABLED, json_logs: bool = TELEMETRY_JSON_LOGS):
+        self.enabled = enabled
+        self.json_logs = json_logs
+        self.histograms: Dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+        self.server = None
+        if json_logs and not logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    def span(self, name: str, **attrs):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, attrs)
+
+    def observe(self, name: str, seconds: float, error: bool = False, **attrs):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        histogram.observe(seconds, error)
+        if self.json_logs:
+            logger.info(json.dumps({"ts": time.time(), "span": name, "ms": round(seconds * 1000, 3),
+                                    "error": error, **attrs}, default=str))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            histograms = dict(self.histograms)
+        return {name: histogram.summary() for name, histogram in sorted(histograms.items())}
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render_prometheus(self) -> str:
+        """The histograms in the Prometheus text exposition format."""
+        lines: List[str] = ["# HELP anjali_stage_seconds Latency of each turn stage.",
+                            "# TYPE anjali_stage_seconds histogram"]
+        errors: List[str] = ["# HELP anjali_stage_errors_total Stage executions that raised.",
+                             "# TYPE anjali_stage_errors_total counter"]
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+        for name, histogram in histograms:
+            with histogram.lock:
+                counts, count, total, failed = list(histogram.counts), histogram.count, histogram.sum, histogram.errors
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + [float("inf")], counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'anjali_stage_seconds_bucket{{stage="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'anjali_stage_seconds_sum{{stage="{name}"}} {total}')
+            lines.append(f'anjali_stage_seconds_count{{stage="{name}"}} {count}')
+            errors.append(f'anjali_stage_errors_total{{stage="{name}"}} {failed}')
+        return "\n".join(lines + errors) + "\n"
+
+    def start_server(self, port: Optional[int] = METRICS_PORT):
+        """Serves `/metrics` on a daemon thread. Does nothing without a port or when already running."""
+        if not port or self.server is not None:
+            return
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # Scrapes every few seconds would drown the app's own output
+
+        with self.lock:
+            if self.server is not None:
+                return
+            try:
+                self.server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+            except OSError as e:
+                # Another Streamlit process on this host already serves the port
+                print(f"Metrics endpoint not started on port {port}: {e}")
+                return
+        threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True).start()
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry() -> Telemetry:
+    return _telemetry
+
+
+def span(name: str, **attrs):
+    """Times the enclosed block as stage `name` on the process-wide telemetry."""
+    return _telemetry.span(name, **attrs)
+
+
+def observe(name: str, seconds: float, **attrs):
+    _telemetry.observe(name, seconds, **attrs)
+
+
+def timed(name: str):
+    """Decorator form of `span` for timing a whole function."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _telemetry.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
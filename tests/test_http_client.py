@@ -0,0 +1,85 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import CircuitBreaker, CircuitOpenError, HttpClient
+
+
+def ok_response():
+    response = requests.Response()
+    response.status_code = 200
+    return response
+
+
+class CircuitBreakerHalfOpenTest(unittest.TestCase):
+    def setUp(self):
+        self.client = HttpClient()
+        self.breaker = self.client.breakers["test"] = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+        # Open the breaker, so the next call is the half-open probe
+        self.breaker.record_failure()
+
+    def request(self, outcome):
+        with mock.patch.object(self.client.session, "request", side_effect=outcome), \
+                mock.patch("http_client.HTTP_MAX_RETRIES", 0):
+            return self.client.get("test", "http://upstream.invalid/")
+
+    def test_probe_success_closes_breaker(self):
+        self.assertEqual(self.request([ok_response()]).status_code, 200)
+        self.assertIsNone(self.breaker.opened_at)
+        self.assertFalse(self.breaker.probing)
+
+    def test_probe_broken_response_releases_probe(self):
+        with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+            self.request(requests.exceptions.ChunkedEncodingError("truncated"))
+        self.assertFalse(self.breaker.probing)
+        # The endpoint recovered: the next probe gets through and closes the breaker
+        self.assertEqual(self.request([ok_response()]).status_code, 200)
+        self.assertIsNone(self.breaker.opened_at)
+
+    def test_probe_in_flight_blocks_other_calls(self):
+        self.assertTrue(self.breaker.allow())
+        with self.assertRaises(CircuitOpenError):
+            self.request([ok_response()])
+
+
+class RetryPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.client = HttpClient()
+
+    def post(self, outcomes):
+        with mock.patch.object(self.client.session, "request", side_effect=outcomes) as request, \
+                mock.patch("http_client.HTTP_MAX_RETRIES", 2), mock.patch.object(HttpClient, "_backoff"):
+            try:
+                return self.client.post("test", "http://upstream.invalid/"), request.call_count
+            except requests.exceptions.RequestException as e:
+                return e, request.call_count
+
+    def test_post_read_timeout_is_not_retried(self):
+        error, calls = self.post([requests.exceptions.ReadTimeout("stalled"), ok_response()])
+        self.assertIsInstance(error, requests.exceptions.ReadTimeout)
+        self.assertEqual(calls, 1)
+
+    def test_post_dropped_connection_is_not_retried(self):
+        error, calls = self.post([requests.exceptions.ConnectionError("Connection aborted"), ok_response()])
+        self.assertIsInstance(error, requests.exceptions.ConnectionError)
+        self.assertEqual(calls, 1)
+
+    def test_post_connect_timeout_is_retried(self):
+        response, calls = self.post([requests.exceptions.ConnectTimeout("no route"), ok_response()])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(calls, 2)
+
+    def test_get_dropped_connection_is_retried(self):
+        with mock.patch.object(self.client.session, "request",
+                               side_effect=[requests.exceptions.ConnectionError("reset"), ok_response()]), \
+                mock.patch.object(HttpClient, "_backoff"):
+            self.assertEqual(self.client.get("test", "http://upstream.invalid/").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import MemoryDatabase
+from retrieval import RetrievalEngine, query_terms
+
+MEMORIES = ["My name is Asha", "My birthday is on the 14th of March", "I like jazz", "I am happy at my new job",
+            "My sister Priya loves jazz", "Rahul likes jazz concerts", "My jazz teacher is Meera"]
+
+
+class RecordingEngine(RetrievalEngine):
+    """Stands in for Chroma: records vector searches and answers each with one marker memory."""
+    def __init__(self, db):
+        super().__init__(db)
+        self.vector_queries = []
+
+    def _add_vector_candidates(self, query, limit, candidates):
+        self.vector_queries.append(query)
+        candidates["vector hit"] = {"content": "vector hit", "importance": 5, "timestamp": None, "relevance": 0.9}
+
+
+class RetrievalRoutingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = MemoryDatabase(path=os.path.join(self.tmp.name, "memories.db"))
+        for content in MEMORIES:
+            self.db.store.write('INSERT INTO memories (user_id, memory_type, content, importance, created_at, context) '
+                                "VALUES (?, 'general', ?, 5, '2026-01-01', '')", (self.db.user_id, content))
+        self.db.flush()
+        self.engine = RecordingEngine(self.db)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_greetings_skip_retrieval(self):
+        for query in ["hi", "hey there", "ok thanks!", "good morning"]:
+            self.assertEqual(query_terms(query), [])
+            self.assertEqual(self.engine.search(query), [])
+        self.assertEqual(self.engine.vector_queries, [])
+
+    def test_trigger_word_questions_reach_vector_search(self):
+        for query in ["What is my name?", "What's my name?", "When is my birthday?", "what do i like", "am i happy"]:
+            results = self.engine.search(query)
+            self.assertIn("vector hit", [memory["content"] for memory in results], query)
+        self.assertEqual(len(self.engine.vector_queries), 5)
+
+    def test_partial_lexical_match_still_searches_vectors(self):
+        self.engine.search("does my sister enjoy hiking")
+        self.assertEqual(self.engine.vector_queries, ["does my sister enjoy hiking"])
+
+    def test_trigger_words_do_not_make_hits_confident(self):
+        # Every memory below matches "love"/"like"/"happy", but only the jazz ones answer the query
+        for query in ["I love jazz", "jazz"]:
+            results = self.engine.search(query, limit=3)
+            self.assertTrue(all("jazz" in memory["content"].lower() for memory in results), query)
+        self.assertEqual(self.engine.vector_queries, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List
+
+from config import (TTS_BACKEND, TTS_HTTP_URL, TTS_LANG, TTS_TLD, TTS_CACHE_DIR, TTS_CACHE_MAX_MB, TTS_WORKERS,
+                    TTS_MAX_CHUNK_CHARS)
+from http_client import get_client
+from startup import lazy_import
+from telemetry import span
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+|\n+")
+_SOFT_BREAK = re.compile(r"(?<=[,;:])\s+|\s+")
+_SPOKEN = re.compile(r"\w")
+
+
+def split_sentences(text: str, max_chars: int = TTS_MAX_CHUNK_CHARS) -> List[str]:
+    """Splits a reply into speakable chunks, breaking overlong sentences at commas or spaces."""
+    chunks = []
+    for sentence in _SENTENCE_END.split(text or ""):
+        sentence = sentence.strip()
+        while len(sentence) > max_chars:
+            cut = max((m.start() for m in _SOFT_BREAK.finditer(sentence, 0, max_chars)), default=max_chars)
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        chunks.append(sentence)
+    # Emoji-only or empty pieces have nothing to say and make gTTS raise
+    return [chunk for chunk in chunks if _SPOKEN.search(chunk)]
+
+
+class SpeechSynthesizer:
+    """Turns replies into MP3 audio one sentence at a time, with an on-disk cache.
+
+    Sentences are synthesized concurrently and each is cached under a hash of
+    (text, lang, tld), so repeated phrases such as greetings and briefings never
+    hit the TTS service twice. Concurrent requests for the same sentence share
+    one synthesis. Once the cache exceeds `TTS_CACHE_MAX_MB`, the least recently
+    used files are deleted. MP3 frames can be concatenated, so the chunks join
+    into one playable clip.
+    """
+    def __init__(self, cache_dir: str = TTS_CACHE_DIR, max_bytes: int = TTS_CACHE_MAX_MB * 1024 * 1024,
+                 lang: str = TTS_LANG, tld: str = TTS_TLD, workers: int = TTS_WORKERS, backend: str = TTS_BACKEND):
+        if backend not in ("gtts", "http"):
+            raise ValueError(f"Unknown TTS backend {backend!r}; choose 'gtts' or 'http'")
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lang = lang
+        self.tld = tld
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tts")
+        self.in_flight: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_bytes = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith(".mp3"))
+        self.stats = {"chunks": 0, "cache_hits": 0}
+
+    def synthesize(self, text: str) -> bytes:
+        return b"".join(self.iter_chunks(text))
+
+    def iter_chunks(self, text: str) -> Iterator[bytes]:
+        """Yields each sentence's audio in order, as soon as it and all before it are ready."""
+        futures = [self._chunk(chunk) for chunk in split_sentences(text)]
+        for future in futures:
+            yield future.result()
+
+    def _key(self, chunk: str) -> str:
+        return hashlib.sha256(f"{self.backend}\0{self.lang}\0{self.tld}\0{chunk}".encode("utf-8")).hexdigest()
+
+    def _chunk(self, chunk: str) -> Future:
+        key = self._key(chunk)
+        path = os.path.join(self.cache_dir, f"{key}.mp3")
+        with self.lock:
+            self.stats["chunks"] += 1
+            future = self.in_flight.get(key)
+            if future is not None:
+                return future
+            try:
+                with open(path, "rb") as f:
+                    audio = f.read()
+                os.utime(path) # Mark as recently used for eviction
+                self.stats["cache_hits"] += 1
+                future = Future()
+                future.set_result(audio)
+                return future
+            except OSError:
+                pass
+            future = self.in_flight[key] = self.executor.submit(self._render, chunk, key, path)
+            return future
+
+    def _render(self, chunk: str, key: str, path: str) -> bytes:
+        try:
+            with span("tts.chunk", chars=len(chunk)):
+                audio = self._backend(chunk)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+            with self.lock:
+                self.cache_bytes += len(audio)
+                over_budget = self.cache_bytes > self.max_bytes
+            if over_budget:
+                self._evict()
+            return audio
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def _backend(self, chunk: str) -> bytes:
+        if self.backend == "http":
+            response = get_client().post("tts", TTS_HTTP_URL, json={"text": chunk, "lang": self.lang, "tld": self.tld})
+            response.raise_for_status()
+            return response.content
+        tts = lazy_import("gtts").gTTS(text=chunk, lang=self.lang, tld=self.tld, slow=False)
+        audio_fp = io.BytesIO()
+        tts.write_to_fp(audio_fp)
+        return audio_fp.getvalue()
+
+    def _evict(self):
+        """Deletes least recently used clips until the cache is back under 90% of its budget."""
+        with self.lock:
+            entries = sorted((entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".mp3")),
+                             key=lambda entry: entry.stat().st_mtime)
+            total = sum(entry.stat().st_size for entry in entries)
+            for entry in entries:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    total -= size
+                except OSError:
+                    pass
+            self.cache_bytes = total
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+_synthesizer = None
+_synthesizer_lock = threading.Lock()
+
+def get_synthesizer() -> SpeechSynthesizer:
+    global _synthesizer
+    if _synthesizer is None:
+        with _synthesizer_lock:
+            if _synthesizer is None:
+                _synthesizer = SpeechSynthesizer()
+    return _synthesizer
@@ -1,10 +1,8 @@
 import streamlit as st
 from datetime import datetime
-import base64
-from gtts import gTTS
-import speech_recognition as sr
-from pydub import AudioSegment
-import io
+from startup import lazy_import
+from telemetry import span
+from tts import get_synthesizer
 
 def format_timestamp(timestamp_str):
     # (Same as your original code)
@@ -16,45 +14,36 @@ def apply_custom_css():
     st.markdown("""<style> ... </style>""", unsafe_allow_html=True) # Keep your CSS here
 
 def text_to_speech_and_play(text: str):
-    """Converts text to speech and returns an HTML audio player that autoplays."""
+    """Speaks the text through an autoplaying audio player.
+
+    Sentences are synthesized in parallel and served from the on-disk TTS cache
+    when already spoken before. The clip is handed to `st.audio` as bytes, which
+    Streamlit serves from its media endpoint instead of inlining it in the page.
+    """
     try:
-        tts = gTTS(text=text, lang='en', tld='com', slow=False)
-        audio_fp = io.BytesIO()
-        tts.write_to_fp(audio_fp)
-        audio_fp.seek(0)
-        
-        audio_base64 = base64.b64encode(audio_fp.read()).decode('utf-8')
-        audio_tag = f'<audio autoplay="true" src="data:audio/mp3;base64,{audio_base64}">'
-        st.markdown(audio_tag, unsafe_allow_html=True)
+        with span("tts"):
+            audio = get_synthesizer().synthesize(text)
+        if audio:
+            st.audio(audio, format="audio/mp3", autoplay=True)
     except Exception as e:
         print(f"Error in TTS: {e}")
         st.error("Sorry, I couldn't generate voice output.")
 
 def audio_to_text(audio_bytes):
-    """Converts audio bytes to text using SpeechRecognition."""
+    """Transcribes a recording after in-process resampling and silence trimming."""
     if not audio_bytes:
         return None
-    r = sr.Recognizer()
+    # numpy and the recognizer stack are only imported on first voice use
+    speech = lazy_import("speech")
     try:
-        # Convert raw bytes to AudioData
-        audio_segment = AudioSegment.from_file(io.BytesIO(audio_bytes))
-        # Export to a format recognizer understands (WAV)
-        wav_data = io.BytesIO()
-        audio_segment.export(wav_data, format="wav")
-        wav_data.seek(0)
-        
-        with sr.AudioFile(wav_data) as source:
-            audio = r.record(source)
-        
-        # Recognize speech
-        text = r.recognize_google(audio)
-        return text
-    except sr.UnknownValueError:
+        with span("stt"):
+            return speech.get_speech_to_text().transcribe(audio_bytes)
+    except speech.SpeechNotUnderstood:
         st.toast("I couldn't understand what you said. Please try again.", icon="🤔")
         return None
-    except sr.RequestError as e:
+    except speech.SpeechServiceError as e:
         st.toast(f"Speech service error: {e}", icon="🚫")
         return None
     except Exception as e:
         st.error(f"Error processing audio: {e}")
-        return None
\ No newline at end of file
+        return None